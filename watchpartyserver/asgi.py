@@ -2,6 +2,8 @@
 ASGI config for watchpartyserver project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Reaction streams (/parties/<id>/reactions/stream) are served in front of
+Django, see watchpartyserverapi/streams.py.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
@@ -14,3 +16,12 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'watchpartyserver.settings')
 
 application = get_asgi_application()
+
+# imported once the app registry is ready
+from django.conf import settings  # noqa: E402
+from watchpartyserverapi.schedule import schedule  # noqa: E402
+from watchpartyserverapi.streams import StreamRouter  # noqa: E402
+
+application = StreamRouter(application)
+if getattr(settings, 'SCHEDULE_INDEX_REFRESH', True):
+    schedule.start()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -50,7 +51,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PAGINATION_CLASS': 'watchpartyserverapi.pagination.KeysetPagination',
     'PAGE_SIZE': 10
 }
 
@@ -103,6 +104,104 @@ DATABASES = {
 }
 
 
+# Cache for serialized fragments, invalidated by model signals. Each process
+# gets its own local memory cache, so deployments running several workers
+# need a shared backend such as memcached.
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000
+        }
+    }
+}
+
+
+# Where the outbox workers deliver notifications ('firestore', 'local' or
+# 'none'); 'local' and 'none' need no Firestore credentials
+
+NOTIFICATION_SINK = os.environ.get('NOTIFICATION_SINK', 'firestore')
+
+FIREBASE_CREDENTIALS = os.environ.get('FIREBASE_CREDENTIALS', 'firebase_key.json')
+
+FIREBASE_PROJECT_ID = 'superchat-fced2'
+
+# seconds a queued notification waits for newer ones with the same
+# recipient and link before it is delivered. Every notification waits
+# this long, even when no burst follows it, so this is also the minimum
+# delivery latency; 0 delivers on the next poll, coalescing only rows
+# that are already queued together
+NOTIFICATION_COALESCE_WINDOW = 30
+
+
+# The in-memory schedule behind /parties/live and /parties/starting (see
+# watchpartyserverapi/schedule.py) follows Party signals from its own
+# process. A background thread also reloads the parties that have not
+# ended every SCHEDULE_INDEX_MAX_AGE seconds: that is how edits made by
+# other worker processes are picked up, so they can take this long to show
+
+SCHEDULE_INDEX_MAX_AGE = 60
+
+# whether wsgi.py and asgi.py load the schedule and start that thread;
+# without it the schedule is loaded on first use and never reloaded.
+# bench_startup turns it off so its timings hold no database work
+
+SCHEDULE_INDEX_REFRESH = os.environ.get('SCHEDULE_INDEX_REFRESH', '1') != '0'
+
+
+# Reaction streams (see watchpartyserverapi/streams.py): events buffered per
+# connection before a slow reader is told to resync, and seconds between
+# keepalive comments
+
+REACTION_STREAM_BUFFER = 100
+
+REACTION_STREAM_KEEPALIVE = 15
+
+# Absorb reaction toggles in memory and write them behind (see
+# watchpartyserverapi/reactionbuffer.py). Needs a single worker process;
+# a crash loses at most REACTION_FLUSH_INTERVAL seconds or
+# REACTION_FLUSH_THRESHOLD toggles
+
+REACTION_WRITE_BEHIND = False
+
+REACTION_FLUSH_INTERVAL = 1.0
+
+REACTION_FLUSH_THRESHOLD = 500
+
+REACTION_BUFFER_IDLE = 300
+
+# Multipart image uploads (see watchpartyserverapi/uploads.py): largest
+# accepted upload in bytes, and how the worker threads resize and
+# re-encode them before they are stored
+
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+
+IMAGE_MAX_DIMENSION = 1024
+
+IMAGE_FORMAT = 'WEBP'
+
+IMAGE_TRANSCODE_WORKERS = 2
+
+# Thumbnails served at /media/thumb/<size>/<path> (see
+# watchpartyserverapi/thumbnails.py): the sizes that may be requested, where
+# they are kept, and how many bytes of them before the least recently used
+# are evicted
+
+THUMBNAIL_SIZES = (32, 64, 128)
+
+THUMBNAIL_ROOT = BASE_DIR / 'thumbnails'
+
+THUMBNAIL_CACHE_SIZE = 256 * 1024 * 1024
+
+# Party guest and channel member id sets held per process for membership
+# checks (see watchpartyserverapi/memberships.py). Changes made by other
+# worker processes are only seen through a shared CACHES backend
+
+MEMBERSHIP_CACHE_ENTRIES = 1000
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -142,4 +241,8 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 MEDIA_ROOT = 'media'
-MEDIA_URL = '/media/'
\ No newline at end of file
+MEDIA_URL = '/media/'
+
+# Uploads are stored under their sha256, so identical files are written
+# once; collect_media deletes the ones nothing references any more
+DEFAULT_FILE_STORAGE = 'watchpartyserverapi.storage.ContentAddressedStorage'
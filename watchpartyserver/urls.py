@@ -18,6 +18,8 @@ router.register(r'parties', Parties, 'party')
 router.register(r'partyguests', PartyGuests, 'partyguest')
 router.register(r'reactions', Reactions, 'reaction')
 router.register(r'messagereactions', MessageReactions, 'messagereaction')
+router.register(r'notifications', Notifications, 'notification')
+router.register(r'sync', Sync, 'sync')
 
 
 urlpatterns = [
@@ -27,4 +29,5 @@ urlpatterns = [
     url(r'^login$', login_user),
     url(r'^api-token-auth$', obtain_auth_token),
     url(r'^api-auth', include('rest_framework.urls', namespace='rest_framework')),
+    url(r'^media/thumb/(?P<size>\d+)/(?P<path>.+)$', thumbnail, name='thumbnail'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'watchpartyserver.settings')
 
 application = get_wsgi_application()
+
+# imported once the app registry is ready
+from django.conf import settings  # noqa: E402
+from watchpartyserverapi.schedule import schedule  # noqa: E402
+
+if getattr(settings, 'SCHEDULE_INDEX_REFRESH', True):
+    schedule.start()
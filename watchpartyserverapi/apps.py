@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 
 class WatchpartyapiConfig(AppConfig):
-    name = 'watchpartyapi'
+    name = 'watchpartyserverapi'
+
+    def ready(self):
+        # connect the model signal receivers
+        from watchpartyserverapi import signals
@@ -0,0 +1,114 @@
+"""Cache of serialized model fragments"""
+from hashlib import md5
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+from watchpartyserverapi.models import Member
+
+FRAGMENT_TIMEOUT = 60 * 60
+
+
+def version_key(kind, pk):
+    return f'fragment-version:{kind}:{pk}'
+
+
+def invalidate(kind, *ids):
+    """drop the current version of each fragment so the next read rebuilds it
+
+    Readers add a fresh version when theirs is missing, so a fragment built
+    from rows read before the invalidation is stored under a version nobody
+    asks for again. Inside a transaction the change is not visible to other
+    connections until it commits, and one of them may read the old rows
+    after the drop and store them under the fresh version, so the versions
+    are dropped a second time once the transaction commits.
+    """
+    keys = [version_key(kind, pk) for pk in ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def cached_id(key, lookup):
+    """id stored under key, calling lookup() once on a miss
+
+    Only for mappings that never change, e.g. a user's member id, since
+    the entry is kept until evicted.
+    """
+    value = cache.get(key)
+    if value is None:
+        value = lookup()
+        cache.set(key, value, None)
+    return value
+
+
+def member_id(user):
+    """the member id of an authenticated user"""
+    return cached_id(f'member-id:{user.id}', lambda: Member.objects.values_list('id', flat=True).get(user=user))
+
+
+class FragmentSet:
+    """Serialized dicts of one kind for a set of ids, read with one multi-get
+
+    Fragments are keyed by kind, id, version and the request's base URL,
+    since hyperlinks and image URLs are absolute.
+
+    Arguments:
+        kind -- fragment name, e.g. 'party'
+        ids -- primary keys to look up
+        request -- request the fragments are rendered for
+    """
+
+    def __init__(self, kind, ids, request):
+        self.kind = kind
+        self.scope = md5(request.build_absolute_uri('/').encode('utf-8')).hexdigest()[:12]
+        self.ids = list(dict.fromkeys(pk for pk in ids if pk is not None))
+        self.versions = self.get_versions(self.ids)
+
+        keys = {self.fragment_key(pk): pk for pk in self.versions}
+        self.fragments = {keys[key]: fragment for key, fragment in cache.get_many(keys).items()}
+        self.pending = {}
+
+    def __getitem__(self, pk):
+        return self.fragments[pk]
+
+    def __contains__(self, pk):
+        return pk in self.fragments
+
+    @property
+    def missing(self):
+        return [pk for pk in self.ids if pk not in self.fragments]
+
+    def get_versions(self, ids):
+        keys = {version_key(self.kind, pk): pk for pk in ids}
+        versions = cache.get_many(keys)
+
+        absent = [key for key in keys if key not in versions]
+        if absent:
+            for key in absent:
+                cache.add(key, uuid4().hex, None)
+            versions.update(cache.get_many(absent))
+
+        return {keys[key]: version for key, version in versions.items()}
+
+    def fragment_key(self, pk):
+        return f'fragment:{self.kind}:{pk}:{self.versions[pk]}:{self.scope}'
+
+    def store(self, pk, fragment):
+        self.fragments[pk] = fragment
+        if pk in self.versions:
+            self.pending[self.fragment_key(pk)] = fragment
+
+    def fill(self, queryset, serializer_class, context):
+        """serialize the missing rows of queryset and cache them"""
+        missing = self.missing
+        if missing:
+            rows = queryset.filter(pk__in=missing)
+            for row in rows:
+                self.store(row.pk, dict(serializer_class(row, context=context).data))
+        self.save()
+        return self
+
+    def save(self):
+        if self.pending:
+            cache.set_many(self.pending, FRAGMENT_TIMEOUT)
+            self.pending = {}
@@ -0,0 +1,79 @@
+"""Change log behind the /sync endpoint
+
+signals.py records a ChangeLogEntry for every save and delete of the
+synced models; bulk writes that send no signals call record_many(). The
+entry id is the version a client passes back as ?since=.
+"""
+from django.db.models import Q
+from watchpartyserverapi.models import (Channel, ChangeLogEntry, ChannelMember,
+                                        MessageReaction, Party, PartyGuest)
+
+SYNCED_MODELS = {
+    Party: 'party',
+    PartyGuest: 'partyguest',
+    Channel: 'channel',
+    ChannelMember: 'channelmember',
+    MessageReaction: 'messagereaction',
+}
+
+# deleting these only reveals an id, and after the delete nothing is left
+# to decide who could see them, so their tombstones go to everyone
+PUBLIC_TOMBSTONES = ('party', 'channel')
+
+
+def scope(instance):
+    """the party, channel and member an entry about instance is visible through"""
+    if isinstance(instance, Party):
+        return {'party_id': instance.id, 'channel_id': instance.channel_id}
+    if isinstance(instance, Channel):
+        return {'channel_id': instance.id, 'member_id': instance.creator_id}
+    if isinstance(instance, PartyGuest):
+        return {'party_id': instance.party_id, 'member_id': instance.guest_id}
+    if isinstance(instance, ChannelMember):
+        return {'channel_id': instance.channel_id, 'member_id': instance.member_id}
+    return {'party_id': instance.party_id, 'member_id': instance.reactor_id}
+
+
+def entry(instance, deleted=False):
+    return ChangeLogEntry(
+        model=SYNCED_MODELS[type(instance)], object_id=instance.id, deleted=deleted, **scope(instance)
+    )
+
+
+def record(instance, deleted=False):
+    """log a save (or delete) of a synced model instance"""
+    entry(instance, deleted).save()
+
+
+def record_many(instances, deleted=False):
+    """log rows written with bulk_create() or update(), which send no signals"""
+    ChangeLogEntry.objects.bulk_create([entry(instance, deleted) for instance in instances])
+
+
+def visible_parties(member_id):
+    """parties that are public, or the member created, is a guest of or belongs to the channel of"""
+    channels = ChannelMember.objects.filter(member_id=member_id).values('channel_id')
+    return Party.objects.filter(
+        Q(is_public=True) | Q(creator_id=member_id) |
+        Q(partyguest__guest_id=member_id) | Q(channel_id__in=channels)
+    )
+
+
+def visible_entries(member_id):
+    """entries about parties and channels the member can currently see
+
+    See visible_parties(); a channel is visible to its creator and members.
+    Entries about the member's own guest, channel member and reaction rows
+    are always visible, so removals reach them.
+    """
+    channels = ChannelMember.objects.filter(member_id=member_id).values('channel_id')
+    parties = visible_parties(member_id).values('id')
+
+    return ChangeLogEntry.objects.filter(
+        Q(party_id__in=parties) | Q(channel_id__in=channels) | Q(member_id=member_id) |
+        Q(deleted=True, model__in=PUBLIC_TOMBSTONES)
+    )
+
+
+def latest_version():
+    return ChangeLogEntry.objects.order_by('-id').values_list('id', flat=True).first() or 0
@@ -0,0 +1,30 @@
+"""Conditional GET support for detail endpoints"""
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def entity_tag(kind, pk, modified):
+    """strong ETag for one version of a resource"""
+    return f'"{kind}-{pk}-{int(modified.timestamp() * 1000000)}"'
+
+
+def not_modified(request, etag, modified):
+    """
+    304 (or 412) response when the request's If-None-Match/If-Modified-Since
+    validators still match, otherwise None
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=int(modified.timestamp()))
+    if response is not None:
+        add_validators(response, etag, modified)
+    return response
+
+
+def add_validators(response, etag, modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified.timestamp())
+    return response
+
+
+def latest(*timestamps):
+    """most recent of the given timestamps, ignoring missing ones"""
+    return max(timestamp for timestamp in timestamps if timestamp is not None)
@@ -0,0 +1,85 @@
+"""Cold start import cost of the WSGI/ASGI entry points"""
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# imports the entry point, then the URLconf a worker loads on its first
+# request, printing the elapsed seconds of each step
+PROBE = """
+import time
+start = time.perf_counter()
+import {module}
+loaded = time.perf_counter()
+import {urlconf}
+print(loaded - start, time.perf_counter() - start)
+"""
+
+
+class Command(BaseCommand):
+    """Time fresh interpreters importing watchpartyserver.wsgi or .asgi.
+
+    Each run is a new process, so nothing is shared with the command or
+    with earlier runs. The schedule refresh thread is turned off in them
+    with SCHEDULE_INDEX_REFRESH=0, so no database work is timed. With
+    --top N one more run uses python -X importtime and lists the N
+    modules with the highest import self time, e.g.
+
+        python manage.py bench_startup --runs 10 --top 15
+    """
+    help = 'Time cold imports of the WSGI/ASGI application'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entry', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=0,
+                            help='list the modules with the highest import self time')
+
+    def handle(self, *args, **options):
+        module = f"watchpartyserver.{options['entry']}"
+        code = PROBE.format(module=module, urlconf=settings.ROOT_URLCONF)
+        env = dict(os.environ, SCHEDULE_INDEX_REFRESH='0', DJANGO_SETTINGS_MODULE=os.environ.get(
+            'DJANGO_SETTINGS_MODULE', 'watchpartyserver.settings'
+        ))
+
+        loads = []
+        totals = []
+        for _ in range(options['runs']):
+            result = subprocess.run([sys.executable, '-c', code], env=env, check=True,
+                                    capture_output=True, text=True)
+            load, total = map(float, result.stdout.split()[-2:])
+            loads.append(load)
+            totals.append(total)
+
+        self.stdout.write(
+            f"{module}: median {median(loads) * 1000:.0f}ms, "
+            f"with {settings.ROOT_URLCONF} {median(totals) * 1000:.0f}ms "
+            f"over {options['runs']} runs"
+        )
+
+        if options['top']:
+            result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env,
+                                    check=True, capture_output=True, text=True)
+            for own, name in slowest_imports(result.stderr, options['top']):
+                self.stdout.write(f'{own / 1000:8.1f}ms  {name}')
+
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+
+def slowest_imports(report, count):
+    """(self us, module) pairs from -X importtime output, costliest first
+
+    Self time is what the module's own body cost, without its imports, so
+    the list points at the modules doing work at import time.
+    """
+    rows = []
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        rows.append((int(own), name.strip()))
+    return sorted(rows, reverse=True)[:count]
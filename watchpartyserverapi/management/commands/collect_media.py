@@ -0,0 +1,104 @@
+"""Delete uploaded media that no row references"""
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import FileField
+from django.utils import timezone
+from watchpartyserverapi.storage import is_content_name
+
+
+class Command(BaseCommand):
+    """Walk the upload_to directory of every FileField and ImageField and
+    delete the content-addressed files none of them point at. Files named
+    otherwise, such as uploads from before ContentAddressedStorage, are
+    never touched.
+
+    Files are checked --batch-size at a time with one IN query per field,
+    so memory and query size stay bounded however large the volume is, and
+    --pause spreads the deletes out. Files modified in the last --min-age
+    seconds are kept: an upload is on disk before its row is saved, and
+    the storage touches a file when a new upload reuses it. E.g.
+
+        python manage.py collect_media --batch-size 500 --pause 0.1 --dry-run
+    """
+    help = 'Delete content-addressed media files no longer referenced by any model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='seconds to sleep between batches')
+        parser.add_argument('--min-age', type=int, default=60 * 60,
+                            help='keep files modified in the last this many seconds')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='report what would be deleted without deleting it')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        fields = file_fields()
+        cutoff = timezone.now() - timedelta(seconds=options['min_age'])
+        directories = sorted({field.upload_to for _, field in fields if isinstance(field.upload_to, str)})
+
+        checked = deleted = freed = 0
+        names = (name for name in walk(directories) if is_content_name(name))
+        for batch in batches(names, options['batch_size']):
+            referenced = set()
+            for model, field in fields:
+                referenced.update(
+                    model._default_manager.filter(**{f'{field.name}__in': batch})
+                    .values_list(field.name, flat=True)
+                )
+
+            for name in batch:
+                if name in referenced or default_storage.get_modified_time(name) > cutoff:
+                    continue
+                size = default_storage.size(name)
+                if self.verbosity > 1:
+                    self.stdout.write(f'{"would delete" if options["dry_run"] else "deleting"} {name}')
+                if not options['dry_run']:
+                    default_storage.delete(name)
+                deleted += 1
+                freed += size
+
+            checked += len(batch)
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        verb = 'would delete' if options['dry_run'] else 'deleted'
+        self.stdout.write(f'{checked} files checked, {verb} {deleted} ({freed / 1024 / 1024:.1f}MB)')
+
+
+def file_fields():
+    """(model, field) for every FileField, ImageField included"""
+    return [
+        (model, field)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, FileField)
+    ]
+
+
+def walk(directories):
+    """names of the files under the given storage directories"""
+    directories = [directory.rstrip('/') for directory in directories]
+    while directories:
+        current = directories.pop()
+        if not default_storage.exists(current):
+            continue
+        subdirectories, files = default_storage.listdir(current)
+        directories.extend(f'{current}/{subdirectory}' for subdirectory in subdirectories)
+        for filename in files:
+            yield f'{current}/{filename}'
+
+
+def batches(names, size):
+    batch = []
+    for name in names:
+        batch.append(name)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,94 @@
+"""Deliver queued notifications"""
+import time
+
+from django.core.management.base import BaseCommand
+from watchpartyserverapi.models import OutboxNotification
+from watchpartyserverapi.notifications import OutboxWorker
+from watchpartyserverapi.notifications.sinks import SINKS, LocalSink, get_sink
+
+BENCHMARK_RECIPIENT = 'outbox-benchmark'
+
+
+class Command(BaseCommand):
+    """Run the notification outbox workers.
+
+    With --benchmark N the command queues N notifications spread over
+    --recipients dummy recipients, drains only those into the local sink and
+    reports the throughput, e.g.
+
+        python manage.py drain_outbox --benchmark 5000 --recipients 1000 --workers 8 --latency 20
+
+    Pass -v 2 to print the metrics of every flush.
+    """
+    help = 'Deliver queued notifications from a pool of worker threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--sink', choices=sorted(SINKS), default=None,
+                            help='defaults to settings.NOTIFICATION_SINK')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='seconds to wait when nothing is due')
+        parser.add_argument('--until-empty', action='store_true',
+                            help='exit once nothing is due instead of polling')
+        parser.add_argument('--benchmark', type=int, default=0,
+                            help='queue and drain this many notifications into the local sink')
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help='simulated milliseconds per batch commit for the local sink')
+        parser.add_argument('--recipients', type=int, default=0,
+                            help='benchmark recipients; fewer than --benchmark exercises coalescing')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        if options['benchmark']:
+            self.benchmark(options)
+            return
+
+        if options['sink'] == 'local':
+            sink = LocalSink(latency=options['latency'] / 1000)
+        else:
+            sink = get_sink(options['sink'])
+
+        worker = OutboxWorker(sink, batch_size=options['batch_size'], on_flush=self.flushed)
+        try:
+            worker.run(workers=options['workers'], poll_interval=options['poll_interval'],
+                       until_empty=options['until_empty'])
+        except KeyboardInterrupt:
+            worker.stop()
+        self.report(worker)
+
+    def flushed(self, metrics):
+        if self.verbosity >= 2:
+            self.stdout.write(
+                f'flushed {metrics.rows} rows as {metrics.writes} writes in {metrics.batches} batches '
+                f'({metrics.coalesced} coalesced, {metrics.failed} failed) in {metrics.seconds * 1000:.1f}ms'
+            )
+
+    def report(self, worker):
+        self.stdout.write(
+            f'delivered {worker.delivered} rows as {worker.writes} writes in {worker.batches} batches, '
+            f'{worker.coalesced} coalesced, failed attempts {worker.failed}'
+        )
+
+    def benchmark(self, options):
+        count = options['benchmark']
+        recipients = options['recipients'] or count
+        OutboxNotification.objects.bulk_create([
+            OutboxNotification(recipient=f'{BENCHMARK_RECIPIENT}-{i % recipients}', content=f'benchmark {i}', link='/')
+            for i in range(count)
+        ])
+
+        sink = LocalSink(latency=options['latency'] / 1000)
+        pending = OutboxNotification.objects.filter(recipient__startswith=BENCHMARK_RECIPIENT)
+        worker = OutboxWorker(sink, batch_size=options['batch_size'], pending=pending, on_flush=self.flushed)
+
+        start = time.perf_counter()
+        worker.run(workers=options['workers'], until_empty=True)
+        elapsed = time.perf_counter() - start
+
+        pending.delete()
+        self.stdout.write(
+            f"{worker.delivered}/{count} delivered by {options['workers']} workers "
+            f"in {elapsed:.2f}s ({worker.delivered / elapsed:.0f}/s)"
+        )
+        self.report(worker)
@@ -0,0 +1,140 @@
+"""Query plans and timings for the hot lookup paths"""
+import uuid
+from datetime import datetime, timedelta
+from timeit import repeat
+from types import SimpleNamespace
+
+import pytz
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import Count, Q
+
+MODELS = ('Channel', 'ChannelMember', 'Member', 'MessageReaction', 'Party', 'PartyGuest', 'Reaction')
+
+
+class Command(BaseCommand):
+    """Print EXPLAIN output and median timings for the roster, reaction and
+    upcoming-party lookups the views run on every request.
+
+    Run it once on a database migrated to 0017 and once on the latest
+    migration to compare table scans with index lookups. The models are
+    taken from the migrations the database is at, so the older schema
+    can be seeded too, e.g.
+
+        python manage.py migrate watchpartyserverapi 0017
+        python manage.py explain_lookups --seed 5000
+        python manage.py migrate watchpartyserverapi
+        python manage.py explain_lookups --seed 5000
+    """
+    help = 'Print query plans and timings for the hot lookup paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='insert this many synthetic parties first (rolled back afterwards)')
+        parser.add_argument('--repeat', type=int, default=200,
+                            help='timed executions per lookup')
+
+    def handle(self, *args, **options):
+        self.models = migrated_models()
+        with transaction.atomic():
+            if options['seed']:
+                self.seed(options['seed'])
+
+            for name, queryset in self.lookups():
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self.stdout.write(queryset.explain())
+
+                timings = repeat(lambda: list(queryset.all()), number=1, repeat=options['repeat'])
+                median = sorted(timings)[len(timings) // 2]
+                self.stdout.write(f"median {median * 1e6:.1f}us over {options['repeat']} runs\n")
+
+            transaction.set_rollback(True)
+
+    def lookups(self):
+        """(name, queryset) for each hot path, keyed on the most recent rows"""
+        PartyGuest, ChannelMember, MessageReaction, Party = (
+            self.models.PartyGuest, self.models.ChannelMember, self.models.MessageReaction, self.models.Party
+        )
+        guest = PartyGuest.objects.order_by('-id').first()
+        channel_member = ChannelMember.objects.order_by('-id').first()
+        reaction = MessageReaction.objects.order_by('-id').first()
+        if guest is None or channel_member is None or reaction is None:
+            self.stderr.write('No data to look up, pass --seed')
+            return []
+
+        return [
+            ('PartyGuest(party, guest)',
+             PartyGuest.objects.filter(party_id=guest.party_id, guest_id=guest.guest_id)),
+            ('ChannelMember(channel, member)',
+             ChannelMember.objects.filter(channel_id=channel_member.channel_id, member_id=channel_member.member_id)),
+            ('MessageReaction(party, message_id)',
+             MessageReaction.objects.filter(party_id=reaction.party_id, message_id=reaction.message_id)),
+            ('MessageReaction(party, reactor, reaction, message_id)',
+             MessageReaction.objects.filter(party_id=reaction.party_id, reactor_id=reaction.reactor_id,
+                                            reaction_id=reaction.reaction_id, message_id=reaction.message_id)),
+            ('MessageReaction counts(party) GROUP BY message_id, reaction',
+             MessageReaction.objects.filter(party_id=reaction.party_id).values('message_id', 'reaction_id').annotate(
+                 count=Count('id'), mine=Count('id', filter=Q(reactor_id=reaction.reactor_id))
+             ).order_by()),
+            ('Party(datetime_end)',
+             Party.objects.filter(datetime_end__gte=datetime.now(pytz.utc))),
+        ]
+
+    def seed(self, party_count):
+        """synthetic members, channels, parties, guests and reactions"""
+        models = self.models
+        User, Member, Reaction, Channel, ChannelMember, Party, PartyGuest, MessageReaction = (
+            models.User, models.Member, models.Reaction, models.Channel, models.ChannelMember,
+            models.Party, models.PartyGuest, models.MessageReaction
+        )
+        # sqlite does not return primary keys from bulk_create, so each
+        # batch is read back by its unique prefix
+        prefix = uuid.uuid4().hex[:8]
+        User.objects.bulk_create([
+            User(username=f'explain-{prefix}-{i}') for i in range(50)
+        ])
+        users = User.objects.filter(username__startswith=f'explain-{prefix}-')
+        Member.objects.bulk_create([
+            Member(user=user, bio='', location='', time_zone_offset=0) for user in users
+        ])
+        members = list(Member.objects.filter(user__in=users))
+
+        if not Reaction.objects.exists():
+            Reaction.objects.create(name='like')
+        reactions = list(Reaction.objects.all()[:3])
+
+        Channel.objects.bulk_create([
+            Channel(name=f'explain-{prefix}', description='', creator=members[i]) for i in range(10)
+        ])
+        channels = list(Channel.objects.filter(name=f'explain-{prefix}'))
+        ChannelMember.objects.bulk_create([
+            ChannelMember(channel=channel, member=member) for channel in channels for member in members
+        ])
+
+        start = datetime.now(pytz.utc) - timedelta(days=party_count // 10)
+        Party.objects.bulk_create([
+            Party(channel=channels[i % len(channels)], creator=members[i % len(members)],
+                  datetime=start + timedelta(hours=i * 2), datetime_end=start + timedelta(hours=i * 2 + 3),
+                  title=f'explain-{prefix}', description='')
+            for i in range(party_count)
+        ])
+        parties = list(Party.objects.filter(title=f'explain-{prefix}'))
+        PartyGuest.objects.bulk_create([
+            PartyGuest(party=party, guest=member) for party in parties for member in members[:8]
+        ])
+        MessageReaction.objects.bulk_create([
+            MessageReaction(party=party, reactor=member, reaction=reactions[m % len(reactions)],
+                            message_id=f'{party.id}-{m % 5}')
+            for party in parties for m, member in enumerate(members[:8])
+        ])
+
+
+def migrated_models():
+    """the models as of the migrations applied to the database, which may predate the current ones"""
+    loader = MigrationLoader(connection)
+    apps = loader.project_state(nodes=list(loader.applied_migrations), at_end=True).apps
+    return SimpleNamespace(
+        User=apps.get_model('auth', 'User'),
+        **{name: apps.get_model('watchpartyserverapi', name) for name in MODELS}
+    )
@@ -0,0 +1,104 @@
+"""In-process load test of the reaction stream fan-out"""
+import asyncio
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from watchpartyserverapi.streams import ReactionBroker, stream
+
+
+class Command(BaseCommand):
+    """Connect thousands of simulated SSE subscribers to one party and
+    publish reaction events from a worker thread, as the views do.
+
+    Subscribers run the real stream() coroutine against in-memory ASGI
+    receive/send callables, so encoding, buffering and fan-out are
+    measured without sockets. A --slow fraction of them stall on every
+    write to exercise the bounded buffers, e.g.
+
+        python manage.py stream_loadtest --subscribers 5000 --events 200 --slow 0.01
+    """
+    help = 'Measure reaction stream fan-out latency with simulated subscribers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=2000)
+        parser.add_argument('--events', type=int, default=100)
+        parser.add_argument('--rate', type=float, default=50.0,
+                            help='events published per second')
+        parser.add_argument('--slow', type=float, default=0.0,
+                            help='fraction of subscribers that stall on each write')
+        parser.add_argument('--stall', type=float, default=50.0,
+                            help='milliseconds a slow subscriber takes per write')
+        parser.add_argument('--buffer', type=int, default=100,
+                            help='events buffered per subscriber')
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options))
+
+    async def run(self, options):
+        broker = ReactionBroker(buffer_size=options['buffer'], keepalive=60)
+        party_id = 1
+        published = {}
+        latencies = []
+        resynced = set()
+        done = asyncio.Event()
+
+        async def receive():
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        def subscriber(index, slow):
+            async def send(message):
+                now = time.perf_counter()
+                for chunk in message['body'].split(b'\n\n'):
+                    if chunk.startswith(b'event: reaction'):
+                        # seq is the first payload key; skip a full json parse per delivery
+                        start = chunk.index(b'"seq":') + 6
+                        seq = int(chunk[start:chunk.index(b',', start)])
+                        latencies.append(now - published[seq])
+                    elif chunk.startswith(b'event: resync'):
+                        resynced.add(index)
+                if slow:
+                    await asyncio.sleep(options['stall'] / 1000)
+            return send
+
+        slow_count = int(options['subscribers'] * options['slow'])
+        tasks = [
+            asyncio.ensure_future(stream(broker, party_id, receive, subscriber(i, i < slow_count)))
+            for i in range(options['subscribers'])
+        ]
+        while broker.subscribers(party_id) < options['subscribers']:
+            await asyncio.sleep(0.01)
+
+        def publish():
+            interval = 1 / options['rate']
+            for seq in range(options['events']):
+                published[seq] = time.perf_counter()
+                broker.publish(party_id, 'reaction', {
+                    'seq': seq, 'message_id': 'load', 'reaction_id': random.randint(1, 6),
+                    'reactor_id': 1, 'added': True, 'count': seq
+                })
+                time.sleep(interval)
+
+        start = time.perf_counter()
+        await asyncio.get_running_loop().run_in_executor(None, publish)
+        # let the fast subscribers catch up before disconnecting everyone
+        await asyncio.sleep(0.5)
+        elapsed = time.perf_counter() - start
+        done.set()
+        await asyncio.gather(*tasks)
+
+        fast_expected = (options['subscribers'] - slow_count) * options['events']
+        latencies.sort()
+        self.stdout.write(
+            f"{options['subscribers']} subscribers ({slow_count} slow), {options['events']} events "
+            f"in {elapsed:.2f}s: {len(latencies)} deliveries (fast subscribers expect {fast_expected}), "
+            f"{len(resynced)} subscribers resynced"
+        )
+        if latencies:
+            def percentile(p):
+                return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000
+            self.stdout.write(
+                f'latency p50 {percentile(0.5):.1f}ms, p99 {percentile(0.99):.1f}ms, '
+                f'max {latencies[-1] * 1000:.1f}ms'
+            )
@@ -0,0 +1,86 @@
+"""Cached member id sets of parties and channels, for membership checks"""
+import threading
+from collections import OrderedDict
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from watchpartyserverapi.cache import invalidate, version_key
+from watchpartyserverapi.models import ChannelMember, PartyGuest
+
+# roster kind: (model, column of the party or channel, column of the member)
+ROSTERS = {
+    'party-guests': (PartyGuest, 'party_id', 'guest_id'),
+    'channel-members': (ChannelMember, 'channel_id', 'member_id'),
+}
+
+
+class MembershipCache:
+    """Process-local frozensets of the member ids of each party and channel
+
+    Every set is kept with the version its roster had in the Django cache
+    when it was read, like the fragments in cache.py. A check costs one
+    cache get for that version plus a set lookup; when the version moved
+    on, or the roster is not held here, it is read again with one query.
+    The PartyGuest and ChannelMember signals drop the version. A process
+    only sees versions dropped by another one when CACHES is a backend
+    they share, such as memcached: with the default per-process local
+    memory cache, a roster changed by another worker stays outdated here
+    until this process changes it too, so run one worker or configure a
+    shared cache before relying on these checks for access control.
+
+    At most max_entries rosters are held, the least recently used are
+    dropped first.
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.rosters = OrderedDict()
+
+    def members(self, kind, pk):
+        """frozenset of the member ids in the party or channel"""
+        key = version_key(kind, pk)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, uuid4().hex, None)
+            version = cache.get(key)
+
+        with self.lock:
+            held = self.rosters.get((kind, pk))
+            if held is not None and version is not None and held[0] == version:
+                self.rosters.move_to_end((kind, pk))
+                return held[1]
+
+        # the version is read first, so a change made while the rows are
+        # read leaves this copy outdated rather than current
+        model, scope, member = ROSTERS[kind]
+        member_ids = frozenset(model.objects.filter(**{scope: pk}).values_list(member, flat=True))
+        if version is not None:
+            with self.lock:
+                self.rosters[(kind, pk)] = (version, member_ids)
+                self.rosters.move_to_end((kind, pk))
+                while len(self.rosters) > self.max_entries:
+                    self.rosters.popitem(last=False)
+        return member_ids
+
+    def is_guest(self, party_id, member_id):
+        return member_id in self.members('party-guests', party_id)
+
+    def is_channel_member(self, channel_id, member_id):
+        return member_id in self.members('channel-members', channel_id)
+
+    def guest_count(self, party_id):
+        return len(self.members('party-guests', party_id))
+
+    def member_count(self, channel_id):
+        return len(self.members('channel-members', channel_id))
+
+    def changed(self, kind, pk):
+        """mark a roster as changed, for writes that send no signals too"""
+        invalidate(kind, pk)
+
+
+memberships = MembershipCache(
+    max_entries=getattr(settings, 'MEMBERSHIP_CACHE_ENTRIES', 1000)
+)
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.4 on 2026-10-18 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watchpartyserverapi', '0017_channel_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='party',
+            index=models.Index(fields=['datetime_end'], name='party_datetime_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='partyguest',
+            index=models.Index(fields=['party', 'guest'], name='partyguest_party_guest_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.1.4 on 2026-10-18 14:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watchpartyserverapi', '0018_party_upcoming_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='party',
+            name='party_datetime_end_idx',
+        ),
+        migrations.AddIndex(
+            model_name='party',
+            index=models.Index(fields=['datetime'], name='party_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='party',
+            index=models.Index(fields=['datetime_end', 'datetime'], name='party_datetime_end_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.1.4 on 2026-10-18 14:38
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicates(apps, schema_editor):
+    """keep the oldest row of each duplicated roster entry or reaction"""
+    lookups = (
+        ('PartyGuest', ('party', 'guest')),
+        ('ChannelMember', ('channel', 'member')),
+        ('MessageReaction', ('party', 'reactor', 'reaction', 'message_id')),
+    )
+    for model_name, fields in lookups:
+        model = apps.get_model('watchpartyserverapi', model_name)
+        keep = model.objects.values(*fields).annotate(keep_id=Min('id')).values('keep_id')
+        model.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watchpartyserverapi', '0019_party_window_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='partyguest',
+            name='partyguest_party_guest_idx',
+        ),
+        migrations.AddIndex(
+            model_name='messagereaction',
+            index=models.Index(fields=['party', 'message_id'], name='messagereaction_message_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='channelmember',
+            constraint=models.UniqueConstraint(fields=('channel', 'member'), name='channelmember_channel_member_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='messagereaction',
+            constraint=models.UniqueConstraint(fields=('party', 'reactor', 'reaction', 'message_id'), name='messagereaction_toggle_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='partyguest',
+            constraint=models.UniqueConstraint(fields=('party', 'guest'), name='partyguest_party_guest_uniq'),
+        ),
+    ]
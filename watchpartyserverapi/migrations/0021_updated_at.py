@@ -0,0 +1,28 @@
+# Generated by Django 3.1.4 on 2026-10-18 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watchpartyserverapi', '0020_unique_lookups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='party',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
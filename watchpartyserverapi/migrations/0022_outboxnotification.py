@@ -0,0 +1,37 @@
+# Generated by Django 3.1.4 on 2026-10-18 14:44
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watchpartyserverapi', '0021_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxNotification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.CharField(max_length=50)),
+                ('content', models.CharField(max_length=255)),
+                ('link', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.IntegerField(default=0)),
+                ('claim', models.CharField(blank=True, default='', max_length=32)),
+                ('failed_at', models.DateTimeField(null=True)),
+                ('last_error', models.CharField(blank=True, default='', max_length=255)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='outboxnotification',
+            index=models.Index(condition=models.Q(failed_at__isnull=True), fields=['available_at'], name='outbox_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='outboxnotification',
+            index=models.Index(condition=models.Q(failed_at__isnull=True), fields=['claim'], name='outbox_claim_idx'),
+        ),
+    ]
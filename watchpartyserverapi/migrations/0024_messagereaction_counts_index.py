@@ -0,0 +1,22 @@
+# Generated by Django 3.1.4 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watchpartyserverapi', '0023_notification_inbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='messagereaction',
+            index=models.Index(fields=['party', 'message_id', 'reaction', 'reactor'], name='messagereaction_counts_idx'),
+        ),
+        # (party, message_id) is a prefix of the new index
+        migrations.RemoveIndex(
+            model_name='messagereaction',
+            name='messagereaction_message_idx',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.1.4 on 2026-10-18 14:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watchpartyserverapi', '0024_messagereaction_counts_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=25)),
+                ('object_id', models.IntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('party_id', models.IntegerField(null=True)),
+                ('channel_id', models.IntegerField(null=True)),
+                ('member_id', models.IntegerField(null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='changelogentry',
+            index=models.Index(fields=['party_id', 'id'], name='changelog_party_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changelogentry',
+            index=models.Index(fields=['channel_id', 'id'], name='changelog_channel_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changelogentry',
+            index=models.Index(fields=['member_id', 'id'], name='changelog_member_idx'),
+        ),
+    ]
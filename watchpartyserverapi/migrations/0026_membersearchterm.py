@@ -0,0 +1,70 @@
+# Generated by Django 3.1.4 on 2026-10-18 15:09
+
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def normalize(text):
+    """text casefolded, without accents and with single spaces"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.casefold().split())
+
+
+def search_terms(first_name, last_name, username):
+    """{(term, kind)} as search.search_terms() derived them when this migration was written"""
+    full_name_kind, name_kind, username_kind = 0, 1, 2
+    terms = set()
+    for name in (first_name, last_name):
+        for word in normalize(name).split():
+            terms.add((word, name_kind))
+    full_name = normalize(f'{first_name} {last_name}')
+    if ' ' in full_name:
+        terms.add((full_name, full_name_kind))
+    if normalize(username):
+        terms.add((normalize(username), username_kind))
+    return {(term[:300], kind) for term, kind in terms}
+
+
+def backfill(apps, schema_editor):
+    """index the names of existing members, in batches"""
+    Member = apps.get_model('watchpartyserverapi', 'Member')
+    MemberSearchTerm = apps.get_model('watchpartyserverapi', 'MemberSearchTerm')
+    rows = Member.objects.values_list('id', 'user__first_name', 'user__last_name', 'user__username')
+
+    terms = []
+    for member_id, first_name, last_name, username in rows.iterator(chunk_size=2000):
+        terms.extend(
+            MemberSearchTerm(member_id=member_id, term=term, kind=kind)
+            for term, kind in search_terms(first_name, last_name, username)
+        )
+        if len(terms) >= 5000:
+            MemberSearchTerm.objects.bulk_create(terms)
+            terms = []
+    MemberSearchTerm.objects.bulk_create(terms)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watchpartyserverapi', '0025_changelog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberSearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=300)),
+                ('kind', models.PositiveSmallIntegerField()),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='watchpartyserverapi.member')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='membersearchterm',
+            index=models.Index(fields=['term', 'kind', 'member'], name='membersearchterm_prefix_idx'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,13 @@
 """models init file"""
+from .changelogentry import ChangeLogEntry
 from .channel import Channel
 from .channelmember import ChannelMember
 from .member import Member
+from .membersearchterm import MemberSearchTerm
 from .messagereaction import MessageReaction
+from .notification import Notification
+from .notificationcounter import NotificationCounter
+from .outboxnotification import OutboxNotification
 from .party import Party
 from .partyguest import PartyGuest
 from .reaction import Reaction
@@ -0,0 +1,24 @@
+"""ChangeLogEntry model"""
+from django.db import models
+
+class ChangeLogEntry(models.Model):
+    """Insert, update or delete of a synced row, read by /sync
+
+    The id is the sync version. party_id, channel_id and member_id scope
+    who may see the entry; they are plain integers so entries outlive the
+    rows they describe.
+    """
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=25)
+    object_id = models.IntegerField()
+    deleted = models.BooleanField(default=False)
+    party_id = models.IntegerField(null=True)
+    channel_id = models.IntegerField(null=True)
+    member_id = models.IntegerField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['party_id', 'id'], name='changelog_party_idx'),
+            models.Index(fields=['channel_id', 'id'], name='changelog_channel_idx'),
+            models.Index(fields=['member_id', 'id'], name='changelog_member_idx'),
+        ]
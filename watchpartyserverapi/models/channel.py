@@ -10,3 +10,4 @@ class Channel(models.Model):
     image = models.ImageField(default='group.png', upload_to='images/channels')
     # image = models.URLField(max_length=400)
     creator = models.ForeignKey(Member, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
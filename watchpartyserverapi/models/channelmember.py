@@ -8,6 +8,11 @@ class ChannelMember(models.Model):
     member = models.ForeignKey(Member, on_delete=models.CASCADE)
     channel = models.ForeignKey(Channel, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['channel', 'member'], name='channelmember_channel_member_uniq'),
+        ]
+
     @property
     def full_name(self):
         return f"{self.member.user.first_name} {self.member.user.last_name}"
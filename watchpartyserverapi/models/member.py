@@ -10,6 +10,7 @@ class Member(models.Model):
     profile_pic = models.ImageField(default='avatar.jpeg', upload_to='images/avatars')
     # profile_pic = models.URLField(max_length=400)
     time_zone_offset = models.IntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
     
     @property
     def full_name(self):
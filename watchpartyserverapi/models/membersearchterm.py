@@ -0,0 +1,23 @@
+"""MemberSearchTerm model"""
+from django.db import models
+
+class MemberSearchTerm(models.Model):
+    """A normalized word or name of a member, for prefix search
+
+    See watchpartyserverapi/search.py, which keeps these in step with User
+    and Member saves.
+    """
+    # lower kinds rank first among members matching the same term
+    FULL_NAME = 0
+    NAME = 1
+    USERNAME = 2
+
+    member = models.ForeignKey("Member", on_delete=models.CASCADE)
+    term = models.CharField(max_length=300)
+    kind = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            # prefix matches are a range scan read in ranking order
+            models.Index(fields=['term', 'kind', 'member'], name='membersearchterm_prefix_idx'),
+        ]
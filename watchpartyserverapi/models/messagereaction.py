@@ -10,3 +10,15 @@ class MessageReaction(models.Model):
     message_id = models.CharField(max_length=255)
     reactor = models.ForeignKey(Member, on_delete=models.CASCADE)
     party = models.ForeignKey(Party, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            # covers the per-message counts, so they never read the table
+            models.Index(fields=['party', 'message_id', 'reaction', 'reactor'], name='messagereaction_counts_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['party', 'reactor', 'reaction', 'message_id'],
+                name='messagereaction_toggle_uniq'
+            ),
+        ]
@@ -0,0 +1,24 @@
+"""Notification model"""
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+class Notification(models.Model):
+    """Notification in a member's inbox"""
+    recipient = models.ForeignKey("Member", on_delete=models.CASCADE)
+    content = models.CharField(max_length=255)
+    link = models.CharField(max_length=255)
+    created_at = models.DateTimeField(default=timezone.now)
+    read_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            # the inbox is read newest first, see views/notifications.py
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notification_inbox_idx'),
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notification_unread_idx',
+                         condition=Q(read_at__isnull=True)),
+        ]
+
+    @property
+    def is_read(self):
+        return self.read_at is not None
@@ -0,0 +1,12 @@
+"""NotificationCounter model"""
+from django.db import models
+
+class NotificationCounter(models.Model):
+    """Number of unread notifications in a member's inbox
+
+    Kept in step with Notification inserts and mark-as-read updates so the
+    badge count is a primary key lookup. It lives apart from Member so
+    profile saves cannot overwrite a concurrent increment.
+    """
+    member = models.OneToOneField("Member", on_delete=models.CASCADE, primary_key=True)
+    unread = models.IntegerField(default=0)
@@ -0,0 +1,22 @@
+"""OutboxNotification model"""
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+class OutboxNotification(models.Model):
+    """Notification waiting to be delivered by the outbox worker"""
+    recipient = models.CharField(max_length=50)
+    content = models.CharField(max_length=255)
+    link = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.IntegerField(default=0)
+    claim = models.CharField(max_length=32, blank=True, default='')
+    failed_at = models.DateTimeField(null=True)
+    last_error = models.CharField(max_length=255, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at'], name='outbox_available_idx', condition=Q(failed_at__isnull=True)),
+            models.Index(fields=['claim'], name='outbox_claim_idx', condition=Q(failed_at__isnull=True)),
+        ]
@@ -12,3 +12,10 @@ class Party(models.Model):
     description = models.CharField(max_length=255)
     is_public = models.BooleanField(default=True)
     title = models.CharField(max_length=50)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['datetime'], name='party_datetime_idx'),
+            models.Index(fields=['datetime_end', 'datetime'], name='party_datetime_end_idx'),
+        ]
@@ -9,6 +9,11 @@ class PartyGuest(models.Model):
     party = models.ForeignKey(Party, on_delete=models.CASCADE)
     rsvp = models.BooleanField(default=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['party', 'guest'], name='partyguest_party_guest_uniq'),
+        ]
+
     @property
     def full_name(self):
         return f"{self.guest.user.first_name} {self.guest.user.last_name}"
@@ -0,0 +1,3 @@
+"""Notification delivery"""
+from .dispatcher import FlushMetrics, NotificationDispatcher
+from .outbox import OutboxWorker, enqueue, enqueue_many
@@ -0,0 +1,85 @@
+"""Coalescing, batching notification dispatcher"""
+import logging
+import time
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Firestore rejects batches with more than 500 writes
+BATCH_LIMIT = 500
+
+FlushMetrics = namedtuple('FlushMetrics', [
+    'rows',         # outbox rows handed to the dispatcher
+    'coalesced',    # rows folded into a newer row for the same recipient and link
+    'writes',       # documents written
+    'batches',      # batch commits attempted
+    'failed',       # documents whose batch failed
+    'seconds',      # wall time of the flush
+])
+
+
+def coalesce_window():
+    """how long a notification waits for newer ones with the same recipient and link"""
+    return timedelta(seconds=getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 30))
+
+
+class NotificationDispatcher:
+    """Collapses outbox rows and writes them to a sink in batches
+
+    Rows with the same recipient and link are delivered once, with the
+    content of the newest row. The writes are committed in batches of at
+    most batch_limit; a failed batch fails every row folded into it.
+
+    Arguments:
+        sink -- object whose write_batch(rows) commits rows or raises
+        batch_limit -- most writes per batch commit
+        on_flush -- optional callable receiving each flush's FlushMetrics
+    """
+
+    def __init__(self, sink, batch_limit=BATCH_LIMIT, on_flush=None):
+        self.sink = sink
+        self.batch_limit = batch_limit
+        self.on_flush = on_flush
+
+    def coalesce(self, rows):
+        """rows grouped by (recipient, link), oldest first within each group"""
+        groups = OrderedDict()
+        for row in sorted(rows, key=lambda row: row.id):
+            groups.setdefault((row.recipient, row.link), []).append(row)
+        return list(groups.values())
+
+    def flush(self, rows):
+        """deliver rows, returning ({row id: error} for failed rows, FlushMetrics)"""
+        start = time.perf_counter()
+        groups = self.coalesce(rows)
+        failures = {}
+        batches = 0
+        failed = 0
+
+        for offset in range(0, len(groups), self.batch_limit):
+            chunk = groups[offset:offset + self.batch_limit]
+            batches += 1
+            try:
+                self.sink.write_batch([group[-1] for group in chunk])
+            except Exception as ex:
+                logger.exception('Notification batch failed')
+                failed += len(chunk)
+                for group in chunk:
+                    for row in group:
+                        failures[row.id] = str(ex)
+
+        metrics = FlushMetrics(
+            rows=len(rows),
+            coalesced=len(rows) - len(groups),
+            writes=len(groups) - failed,
+            batches=batches,
+            failed=failed,
+            seconds=time.perf_counter() - start
+        )
+        logger.info('Notification flush %s', metrics)
+        if self.on_flush is not None:
+            self.on_flush(metrics)
+        return failures, metrics
@@ -0,0 +1,48 @@
+"""Server-hosted notification inbox
+
+Every queued notification is also stored as a Notification row for its
+recipient, in the same transaction. NotificationCounter holds each
+member's unread total and is adjusted by the same statements that insert
+or mark rows, so reading it never counts rows.
+"""
+from django.db.models import F
+from django.utils import timezone
+from watchpartyserverapi.models import Notification, NotificationCounter
+
+
+def store(recipient_ids, content, link, created_at=None):
+    """add a notification to each member's inbox and bump their counters"""
+    recipient_ids = list(dict.fromkeys(int(pk) for pk in recipient_ids))
+    if not recipient_ids:
+        return
+    created_at = created_at or timezone.now()
+
+    Notification.objects.bulk_create([
+        Notification(recipient_id=pk, content=content, link=link, created_at=created_at)
+        for pk in recipient_ids
+    ])
+    NotificationCounter.objects.bulk_create([
+        NotificationCounter(member_id=pk) for pk in recipient_ids
+    ], ignore_conflicts=True)
+    NotificationCounter.objects.filter(member_id__in=recipient_ids).update(unread=F('unread') + 1)
+
+
+def unread_count(member_id):
+    """unread notifications in a member's inbox, from the counter"""
+    return NotificationCounter.objects.filter(member_id=member_id).values_list('unread', flat=True).first() or 0
+
+
+def mark_read(member_id, ids=None):
+    """mark the given (or all) unread notifications read, returning how many changed
+
+    Call inside a transaction. Only rows this statement flips from unread
+    are taken off the counter, so concurrent calls never count a row twice.
+    """
+    unread = Notification.objects.filter(recipient_id=member_id, read_at__isnull=True)
+    if ids is not None:
+        unread = unread.filter(id__in=ids)
+
+    marked = unread.update(read_at=timezone.now())
+    if marked:
+        NotificationCounter.objects.filter(member_id=member_id).update(unread=F('unread') - marked)
+    return marked
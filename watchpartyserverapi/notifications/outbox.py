@@ -0,0 +1,182 @@
+"""Transactional outbox for notifications
+
+Views queue notifications with enqueue()/enqueue_many() inside the same
+transaction as the change they announce. A notification is therefore only
+delivered when the change commits, and a slow or failing notification
+backend never fails the request. OutboxWorker drains the queue from
+background threads. Each notification is also stored in its recipient's
+inbox, see inbox.py.
+
+A queued notification waits NOTIFICATION_COALESCE_WINDOW seconds before it
+is due, so a burst of changes to the same thing reaches each recipient as
+one notification carrying the newest content.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from uuid import uuid4
+
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from watchpartyserverapi.models import OutboxNotification
+
+from . import inbox
+from .dispatcher import NotificationDispatcher, coalesce_window
+
+MAX_ATTEMPTS = 8
+
+# how long a claimed row is hidden from other workers before it is retried
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def enqueue(recipient, content, link):
+    """queue one notification in the current transaction"""
+    now = timezone.now()
+    OutboxNotification.objects.create(
+        recipient=f"{recipient}", content=content, link=link,
+        available_at=now + coalesce_window()
+    )
+    inbox.store([recipient], content, link, created_at=now)
+
+
+def enqueue_many(recipients, content, link):
+    """queue the same notification for many recipients in one insert"""
+    recipients = list(recipients)
+    now = timezone.now()
+    available_at = now + coalesce_window()
+    OutboxNotification.objects.bulk_create([
+        OutboxNotification(recipient=f"{recipient}", content=content, link=link, available_at=available_at)
+        for recipient in recipients
+    ])
+    inbox.store(recipients, content, link, created_at=now)
+
+
+def retry_delay(attempts):
+    """exponential backoff, capped at an hour"""
+    return timedelta(seconds=min(2 ** attempts, 60 * 60))
+
+
+class OutboxWorker:
+    """Delivers queued notifications to a sink from a pool of threads
+
+    Each thread claims a batch of due rows with a conditional UPDATE, along
+    with the other queued rows for the same recipients and links, hands
+    them to a NotificationDispatcher and deletes the delivered rows. Failed
+    rows are retried with exponential backoff until MAX_ATTEMPTS, then kept
+    with failed_at set. A worker that dies mid-batch leaves its rows
+    claimed until CLAIM_LEASE expires.
+
+    Arguments:
+        sink -- object whose write_batch(rows) commits rows or raises
+        batch_size -- due rows claimed per round trip
+        pending -- queryset of rows this worker may claim
+        on_flush -- optional callable receiving each flush's FlushMetrics
+    """
+
+    def __init__(self, sink, batch_size=50, pending=None, on_flush=None):
+        self.dispatcher = NotificationDispatcher(sink, on_flush=self.record)
+        self.batch_size = batch_size
+        self.pending = pending if pending is not None else OutboxNotification.objects.all()
+        self.on_flush = on_flush
+        self.stopped = threading.Event()
+        self.delivered = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.writes = 0
+        self.batches = 0
+        self.lock = threading.Lock()
+
+    def record(self, metrics):
+        with self.lock:
+            self.coalesced += metrics.coalesced
+            self.writes += metrics.writes
+            self.batches += metrics.batches
+        if self.on_flush is not None:
+            self.on_flush(metrics)
+
+    def due(self, now):
+        return self.pending.filter(failed_at__isnull=True, available_at__lte=now)
+
+    def claim(self):
+        now = timezone.now()
+        token = uuid4().hex
+        due = self.due(now).order_by('available_at').values('id')[:self.batch_size]
+
+        # a single UPDATE ... WHERE id IN (SELECT ...), re-checking
+        # available_at so rows another worker just claimed are skipped
+        claimed = OutboxNotification.objects.filter(
+            id__in=due, failed_at__isnull=True, available_at__lte=now
+        ).update(claim=token, available_at=now + CLAIM_LEASE)
+
+        if not claimed:
+            return []
+        rows = list(OutboxNotification.objects.filter(claim=token, failed_at__isnull=True))
+
+        # pull in the other queued rows for the same recipients and links,
+        # due or still inside their coalescing window, so they are delivered
+        # as one write; rows under another worker's live claim are left alone
+        keys = {(row.recipient, row.link) for row in rows}
+        unclaimed = Q(claim='') | Q(available_at__lte=now)
+        waiting = self.pending.filter(
+            unclaimed, recipient__in={recipient for recipient, _ in keys}, failed_at__isnull=True
+        ).exclude(claim=token).values_list('id', 'recipient', 'link')
+        superseded = [pk for pk, recipient, link in waiting if (recipient, link) in keys]
+        if superseded:
+            OutboxNotification.objects.filter(
+                unclaimed, id__in=superseded, failed_at__isnull=True
+            ).update(claim=token, available_at=now + CLAIM_LEASE)
+            rows = list(OutboxNotification.objects.filter(claim=token, failed_at__isnull=True))
+
+        return sorted(rows, key=lambda row: row.id)
+
+    def run_once(self):
+        """deliver one batch, returning the number of rows claimed"""
+        rows = self.claim()
+        if not rows:
+            return 0
+
+        failures, _ = self.dispatcher.flush(rows)
+
+        delivered = [row.id for row in rows if row.id not in failures]
+        OutboxNotification.objects.filter(id__in=delivered).delete()
+
+        now = timezone.now()
+        for row in rows:
+            if row.id in failures:
+                row.attempts += 1
+                row.claim = ''
+                row.last_error = failures[row.id][:255]
+                if row.attempts >= MAX_ATTEMPTS:
+                    row.failed_at = now
+                else:
+                    row.available_at = now + retry_delay(row.attempts)
+                row.save(update_fields=['attempts', 'claim', 'last_error', 'failed_at', 'available_at'])
+
+        with self.lock:
+            self.delivered += len(delivered)
+            self.failed += len(failures)
+        return len(rows)
+
+    def drain(self, poll_interval=1.0, until_empty=False):
+        """deliver batches until stopped, or until nothing is due"""
+        try:
+            while not self.stopped.is_set():
+                if self.run_once() == 0:
+                    if self.due(timezone.now()).exists():
+                        continue  # lost the claim to another worker
+                    if until_empty:
+                        return
+                    self.stopped.wait(poll_interval)
+        finally:
+            connection.close()
+
+    def run(self, workers=4, poll_interval=1.0, until_empty=False):
+        """drain from a pool of threads, blocking until they finish"""
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self.drain, poll_interval, until_empty) for _ in range(workers)]
+            for future in futures:
+                future.result()
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,57 @@
+"""Destinations for outbox notifications"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from watchpartyserverapi.firebase import firebase
+
+
+class FirestoreSink:
+    """Commits notifications to their recipients' Firestore collections"""
+
+    def write_batch(self, rows):
+        firebase.send_notification_batch([
+            (row.recipient, row.content, row.link, row.created_at) for row in rows
+        ])
+
+
+class LocalSink:
+    """Stand-in sink that keeps notifications in memory
+
+    Simulates the round trip latency and failure rate of a batch commit so
+    the outbox can be benchmarked without Firestore credentials.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.delivered = []
+        self.lock = threading.Lock()
+
+    def write_batch(self, rows):
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise IOError('simulated batch failure')
+        with self.lock:
+            self.delivered.extend((row.recipient, row.content, row.link) for row in rows)
+
+
+class NullSink:
+    """Drops notifications, for environments without Firestore credentials"""
+
+    def write_batch(self, rows):
+        pass
+
+
+SINKS = {
+    'firestore': FirestoreSink,
+    'local': LocalSink,
+    'none': NullSink,
+}
+
+
+def get_sink(name=None, **options):
+    """sink named by NOTIFICATION_SINK unless another name is given"""
+    return SINKS[name or getattr(settings, 'NOTIFICATION_SINK', 'firestore')](**options)
@@ -0,0 +1,134 @@
+"""Keyset pagination for list endpoints"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from urllib import parse
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination on a unique ordering key
+
+    Pages are fetched with a `WHERE key > cursor ORDER BY key LIMIT n` query,
+    so every page costs the same as the first one. The cursor is an opaque
+    token holding the key of the first/last row on the current page.
+
+    Arguments:
+        ordering -- model fields forming the key, ending in a unique field;
+                    a leading '-' sorts that field descending
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering=('id',)):
+        self.ordering = tuple(ordering)
+        self.fields = tuple(field.lstrip('-') for field in self.ordering)
+        self.page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 10)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor['reverse']
+
+        if cursor is not None:
+            queryset = queryset.filter(self.key_filter(cursor['key'], reverse))
+
+        if reverse:
+            queryset = queryset.order_by(*[flip(field) for field in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.key_for(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.key_for(self.page[0]), reverse=True)
+
+    def key_for(self, instance):
+        """ordering key of a row, in its JSON form"""
+        return [self.model._meta.get_field(field).value_to_string(instance) for field in self.fields]
+
+    def key_filter(self, key, reverse):
+        """rows strictly after (or before, when reversed) the given key"""
+        condition = Q()
+        for index, field in enumerate(self.fields):
+            lookup = 'lt' if reverse != self.ordering[index].startswith('-') else 'gt'
+            term = Q(**{f'{field}__{lookup}': key[index]})
+            for previous_field, value in zip(self.fields[:index], key[:index]):
+                term &= Q(**{previous_field: value})
+            condition |= term
+        return condition
+
+    def encode_cursor(self, key, reverse):
+        token = json.dumps({'k': key, 'r': reverse}, separators=(',', ':'))
+        encoded = urlsafe_b64encode(token.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            token = json.loads(urlsafe_b64decode(parse.unquote(encoded).encode('ascii')))
+            key = [
+                self.model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, token['k'])
+            ]
+            if len(key) != len(self.fields):
+                raise ValueError(encoded)
+            return {'key': key, 'reverse': bool(token['r'])}
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+
+def flip(field):
+    """the opposite direction of an ordering field"""
+    return field[1:] if field.startswith('-') else f'-{field}'
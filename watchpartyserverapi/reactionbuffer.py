@@ -0,0 +1,239 @@
+"""Write-behind buffer of message reactions for hot parties"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from watchpartyserverapi import changelog
+from watchpartyserverapi.models import MessageReaction, Party, Reaction
+
+logger = logging.getLogger(__name__)
+
+# delete lookups are OR'd together; keep each statement well below
+# SQLite's expression depth limit
+DELETE_CHUNK = 200
+
+
+class PartyReactions:
+    """Who reacted with what on every message of one party"""
+
+    def __init__(self, party_id):
+        self.party_id = party_id
+        self.reactors = defaultdict(set)
+        self.last_used = time.monotonic()
+
+    def load(self):
+        rows = MessageReaction.objects.filter(party_id=self.party_id).values_list(
+            'message_id', 'reaction_id', 'reactor_id'
+        )
+        for message_id, reaction_id, reactor_id in rows:
+            self.reactors[(message_id, reaction_id)].add(reactor_id)
+        return self
+
+
+class ReactionBuffer:
+    """Process-local reaction state that absorbs toggles and writes them behind
+
+    A toggle flips the reactor in the party's in-memory sets and records
+    the row's new desired state; counts are read from the sets. A flusher
+    thread writes the desired states to MessageReaction every
+    flush_interval seconds, or as soon as flush_threshold rows are
+    pending, with one bulk insert and a few deletes.
+
+    Recovery: the database holds everything flushed. A party's state is
+    loaded from it on first use after startup, and again after the party
+    has been idle for idle_timeout seconds and was evicted.
+
+    Crash loss: toggles not yet flushed are lost if the process dies,
+    i.e. at most flush_interval seconds or flush_threshold toggles. The
+    buffer is flushed at interpreter exit.
+
+    Like the schedule index, the state is per process, so it is only
+    correct with a single worker process serving reactions.
+    """
+
+    def __init__(self, flush_interval=1.0, flush_threshold=500, idle_timeout=300):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.idle_timeout = idle_timeout
+        self.lock = threading.RLock()
+        self.flush_lock = threading.Lock()
+        self.parties = {}
+        self.pending = {}
+        self.reaction_ids = set()
+        self.wakeup = threading.Event()
+        self.flusher = None
+
+    def party(self, party_id):
+        """the party's reactions, loading them on first use; None if there is no such party"""
+        party = self.parties.get(party_id)
+        if party is None:
+            if not Party.objects.filter(pk=party_id).exists():
+                return None
+            party = self.parties[party_id] = PartyReactions(party_id).load()
+        party.last_used = time.monotonic()
+        return party
+
+    def is_reaction(self, reaction_id):
+        if reaction_id not in self.reaction_ids:
+            self.reaction_ids = set(Reaction.objects.values_list('id', flat=True))
+        return reaction_id in self.reaction_ids
+
+    def toggle(self, party_id, reactor_id, reaction_id, message_id):
+        """flip a reaction, returning (added, count), or None for an unknown party or reaction"""
+        with self.lock:
+            party = self.party(party_id)
+            if party is None or not self.is_reaction(reaction_id):
+                return None
+
+            reactors = party.reactors[(message_id, reaction_id)]
+            added = reactor_id not in reactors
+            if added:
+                reactors.add(reactor_id)
+            else:
+                reactors.discard(reactor_id)
+
+            # last write wins; flushing a row back to its stored state is a no-op
+            self.pending[(party_id, reactor_id, reaction_id, message_id)] = added
+            count = len(reactors)
+            backlog = len(self.pending)
+
+        self.start()
+        if backlog >= self.flush_threshold:
+            self.wakeup.set()
+        return added, count
+
+    def counts(self, party_id, message_ids, reactor_id):
+        """{message_id: {reaction_id: count, 'mine': [...]}}, like /messagereactions/counts"""
+        with self.lock:
+            party = self.party(party_id)
+            if party is None:
+                return {}
+            wanted = set(message_ids) if message_ids else None
+
+            counts = {}
+            for (message_id, reaction_id), reactors in party.reactors.items():
+                if not reactors or (wanted is not None and message_id not in wanted):
+                    continue
+                message = counts.setdefault(message_id, {'mine': []})
+                message[reaction_id] = len(reactors)
+                if reactor_id in reactors:
+                    message['mine'].append(reaction_id)
+            return counts
+
+    def forget(self, party_id):
+        """drop a deleted party, along with its unflushed toggles"""
+        with self.lock:
+            self.parties.pop(party_id, None)
+            self.pending = {key: added for key, added in self.pending.items() if key[0] != party_id}
+
+    def start(self):
+        if self.flusher is None:
+            with self.lock:
+                if self.flusher is None:
+                    self.flusher = threading.Thread(target=self.run, name='reaction-flusher', daemon=True)
+                    self.flusher.start()
+                    atexit.register(self.flush)
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+                self.evict()
+            except Exception:
+                logger.exception('Reaction flush failed')
+            finally:
+                connection.close()
+
+    def flush(self):
+        """write every pending toggle, returning the number of rows written"""
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            if not pending:
+                return 0
+
+            try:
+                self.write(pending)
+            except IntegrityError:
+                # a party or member went away since the toggle
+                self.write_by_party(pending)
+            except Exception:
+                self.requeue(pending)
+                raise
+            return len(pending)
+
+    def write_by_party(self, pending):
+        """write the toggles party by party, dropping the parties that still fail"""
+        by_party = defaultdict(dict)
+        for key, added in pending.items():
+            by_party[key[0]][key] = added
+
+        written = set()
+        try:
+            for party_id, rows in by_party.items():
+                try:
+                    self.write(rows)
+                except IntegrityError:
+                    logger.warning('Dropped %d reaction toggles for party %s', len(rows), party_id)
+                written.add(party_id)
+        except Exception:
+            self.requeue({key: added for key, added in pending.items() if key[0] not in written})
+            raise
+
+    def requeue(self, rows):
+        """keep unwritten toggles for the next flush, behind any made since"""
+        with self.lock:
+            self.pending = {**rows, **self.pending}
+
+    def write(self, rows):
+        inserts = [key for key, added in rows.items() if added]
+        deletes = [key for key, added in rows.items() if not added]
+
+        with transaction.atomic():
+            MessageReaction.objects.bulk_create([
+                MessageReaction(party_id=party_id, reactor_id=reactor_id, reaction_id=reaction_id, message_id=message_id)
+                for party_id, reactor_id, reaction_id, message_id in inserts
+            ], ignore_conflicts=True)
+            # bulk_create sends no post_save, so log the rows for /sync here;
+            # the deletes below send post_delete as usual
+            for chunk in chunks(inserts, DELETE_CHUNK):
+                changelog.record_many(MessageReaction.objects.filter(lookups(chunk)))
+
+            for chunk in chunks(deletes, DELETE_CHUNK):
+                MessageReaction.objects.filter(lookups(chunk)).delete()
+
+    def evict(self):
+        """forget parties idle for idle_timeout with nothing left to flush"""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self.lock:
+            busy = {key[0] for key in self.pending}
+            for party_id, party in list(self.parties.items()):
+                if party.last_used < cutoff and party_id not in busy:
+                    del self.parties[party_id]
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def lookups(keys):
+    """rows matching any of the (party, reactor, reaction, message) keys"""
+    condition = Q()
+    for party_id, reactor_id, reaction_id, message_id in keys:
+        condition |= Q(party_id=party_id, reactor_id=reactor_id, reaction_id=reaction_id, message_id=message_id)
+    return condition
+
+
+reaction_buffer = ReactionBuffer(
+    flush_interval=getattr(settings, 'REACTION_FLUSH_INTERVAL', 1.0),
+    flush_threshold=getattr(settings, 'REACTION_FLUSH_THRESHOLD', 500),
+    idle_timeout=getattr(settings, 'REACTION_BUFFER_IDLE', 300)
+)
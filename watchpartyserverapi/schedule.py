@@ -0,0 +1,160 @@
+"""In-memory index of party start and end times"""
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import timedelta
+
+import pytz
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.timezone import is_naive, make_aware
+from watchpartyserverapi.models import Party
+
+logger = logging.getLogger(__name__)
+
+
+def aware(value):
+    """a Party datetime as saved, which views may still hold as a string"""
+    value = Party._meta.get_field('datetime').to_python(value)
+    if is_naive(value):
+        value = make_aware(value, pytz.utc)
+    return value
+
+
+class ScheduleIndex:
+    """Process-local index of party start/end times
+
+    Parties are kept in a list sorted by (start, id). Parties live at `now`
+    all start within max_duration before it, so both queries are a bisect
+    plus a walk over the matching window.
+
+    start() loads the parties that have not ended yet from a background
+    thread when the server starts, and the index follows Party save/delete
+    signals from this process, which also bring back a past party whose
+    times are edited. The same thread reloads it every max_age seconds,
+    which drops parties that have ended and bounds how long writes made by
+    other worker processes go unseen; requests never wait for a reload.
+    A process that did not call start() loads the index on first use.
+    """
+
+    def __init__(self, max_age=60):
+        self.max_age = max_age
+        self.lock = threading.RLock()
+        self.load_lock = threading.Lock()
+        self.loaded_at = None
+        self.replay = None
+        self.refresher = None
+        self.starts = []
+        self.parties = {}
+        self.max_duration = timedelta(0)
+
+    def load(self):
+        """index the parties that have not ended yet"""
+        with self.load_lock:
+            with self.lock:
+                self.replay = []
+            try:
+                parties = {row['id']: row for row in Party.objects.filter(
+                    datetime_end__gte=timezone.now()
+                ).values('id', 'title', 'datetime', 'datetime_end', 'is_public', 'channel_id', 'creator_id')}
+            except Exception:
+                with self.lock:
+                    self.replay = None
+                raise
+
+            with self.lock:
+                self.parties = parties
+                self.starts = sorted((row['datetime'], pk) for pk, row in parties.items())
+                self.max_duration = max(
+                    (row['datetime_end'] - row['datetime'] for row in parties.values()),
+                    default=timedelta(0)
+                )
+                # saves and deletes committed while the rows were read
+                for change in self.replay:
+                    change()
+                self.replay = None
+                self.loaded_at = time.monotonic()
+
+    def ensure_loaded(self):
+        if self.loaded_at is None:
+            self.load()
+
+    def start(self):
+        """load the index now and reload it every max_age seconds, off the request threads"""
+        with self.lock:
+            if self.refresher is not None:
+                return
+            self.refresher = threading.Thread(target=self.run, name='schedule-refresh', daemon=True)
+        self.refresher.start()
+
+    def run(self):
+        while True:
+            try:
+                self.load()
+            except Exception:
+                logger.exception('Loading the schedule index failed')
+            finally:
+                connection.close()
+            time.sleep(self.max_age)
+
+    def apply(self, change):
+        """run change now if the index is loaded, and again after a load in progress"""
+        with self.lock:
+            if self.loaded_at is not None:
+                change()
+            if self.replay is not None:
+                self.replay.append(change)
+
+    def add(self, row):
+        """index a party summary, keeping starts sorted"""
+        self.parties[row['id']] = row
+        insort(self.starts, (row['datetime'], row['id']))
+        self.max_duration = max(self.max_duration, row['datetime_end'] - row['datetime'])
+
+    def remove(self, pk):
+        row = self.parties.pop(pk, None)
+        if row is not None:
+            index = bisect_left(self.starts, (row['datetime'], pk))
+            del self.starts[index]
+
+    def update(self, party):
+        """re-index a saved Party instance"""
+        row = {
+            'id': party.id,
+            'title': party.title,
+            'datetime': aware(party.datetime),
+            'datetime_end': aware(party.datetime_end),
+            'is_public': party.is_public,
+            'channel_id': party.channel_id,
+            'creator_id': party.creator_id,
+        }
+
+        def change():
+            self.remove(row['id'])
+            self.add(row)
+        self.apply(change)
+
+    def delete(self, pk):
+        self.apply(lambda: self.remove(pk))
+
+    def live(self, now):
+        """parties with datetime <= now <= datetime_end, by start time"""
+        self.ensure_loaded()
+        with self.lock:
+            low = bisect_left(self.starts, (now - self.max_duration,))
+            high = bisect_right(self.starts, (now, float('inf')))
+            rows = [self.parties[pk] for _, pk in self.starts[low:high]]
+        return [row for row in rows if row['datetime_end'] >= now]
+
+    def starting(self, now, within):
+        """parties with now < datetime <= now + within, by start time"""
+        self.ensure_loaded()
+        with self.lock:
+            low = bisect_right(self.starts, (now, float('inf')))
+            high = bisect_right(self.starts, (now + within, float('inf')))
+            return [self.parties[pk] for _, pk in self.starts[low:high]]
+
+
+schedule = ScheduleIndex(max_age=getattr(settings, 'SCHEDULE_INDEX_MAX_AGE', 60))
@@ -0,0 +1,88 @@
+"""Prefix search over member names
+
+Every member has MemberSearchTerm rows for each word of their first and
+last name, their full name and their username, normalized by normalize().
+A query matches the terms it is a prefix of, which on the term index is
+the range normalize(q) <= term < normalize(q) + END, read in index order.
+"""
+import unicodedata
+
+from django.db.models import Q
+from watchpartyserverapi.models import MemberSearchTerm
+
+# sorts after every character, so term < prefix + END holds for all
+# terms starting with prefix
+END = chr(0x10FFFF)
+
+# rows read per wanted member and round trip; a member usually matches a
+# prefix with a few terms, e.g. "pete" with first name, full name and
+# username, and more round trips are made when that is not enough
+TERMS_PER_MEMBER = 4
+
+
+def normalize(text):
+    """text casefolded, without accents and with single spaces"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.casefold().split())
+
+
+def search_terms(first_name, last_name, username):
+    """{(term, kind)} for a member with these names"""
+    terms = set()
+    for name in (first_name, last_name):
+        for word in normalize(name).split():
+            terms.add((word, MemberSearchTerm.NAME))
+    full_name = normalize(f'{first_name} {last_name}')
+    if ' ' in full_name:
+        terms.add((full_name, MemberSearchTerm.FULL_NAME))
+    if normalize(username):
+        terms.add((normalize(username), MemberSearchTerm.USERNAME))
+    return {(term[:300], kind) for term, kind in terms}
+
+
+def index(members):
+    """bring the terms of members in line with their names, leaving unchanged ones alone"""
+    for member in members:
+        user = member.user
+        wanted = search_terms(user.first_name, user.last_name, user.username)
+        stored = set(MemberSearchTerm.objects.filter(member=member).values_list('term', 'kind'))
+        if wanted == stored:
+            continue
+
+        MemberSearchTerm.objects.filter(member=member).delete()
+        MemberSearchTerm.objects.bulk_create([
+            MemberSearchTerm(member=member, term=term, kind=kind) for term, kind in wanted
+        ])
+
+
+def matching_members(query, limit):
+    """ids of up to limit members with a term starting with query, best match first
+
+    Matches are ranked as the index reads them: shorter and alphabetically
+    earlier terms first, so an exact name comes before longer ones, then
+    full names, names and usernames for the same term.
+    """
+    prefix = normalize(query)
+    if not prefix:
+        return []
+
+    matches = MemberSearchTerm.objects.filter(
+        term__gte=prefix, term__lt=prefix + END
+    ).order_by('term', 'kind', 'member_id').values_list('term', 'kind', 'member_id')
+
+    member_ids = {}
+    batch_size = limit * TERMS_PER_MEMBER
+    while True:
+        rows = list(matches[:batch_size])
+        for _, _, member_id in rows:
+            member_ids.setdefault(member_id, None)
+            if len(member_ids) == limit:
+                return list(member_ids)
+        if len(rows) < batch_size:
+            return list(member_ids)
+        # carry on after the last row read, in index order
+        term, kind, member_id = rows[-1]
+        matches = matches.filter(
+            Q(term__gt=term) | Q(term=term, kind__gt=kind) | Q(term=term, kind=kind, member_id__gt=member_id)
+        )
@@ -0,0 +1,93 @@
+"""Model signal receivers"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from watchpartyserverapi import cache, changelog, search
+from watchpartyserverapi.memberships import memberships
+from watchpartyserverapi.models import Channel, ChannelMember, Member, MessageReaction, Party, PartyGuest
+from watchpartyserverapi.reactionbuffer import reaction_buffer
+from watchpartyserverapi.schedule import schedule
+
+
+@receiver([post_save, post_delete], sender=Party)
+def party_changed(sender, instance, **kwargs):
+    cache.invalidate('party', instance.id)
+
+
+@receiver(post_save, sender=Party)
+def party_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: schedule.update(instance))
+
+
+@receiver(post_delete, sender=Party)
+def party_deleted(sender, instance, **kwargs):
+    pk = instance.id
+    transaction.on_commit(lambda: schedule.delete(pk))
+    transaction.on_commit(lambda: reaction_buffer.forget(pk))
+
+
+@receiver([post_save, post_delete], sender=PartyGuest)
+def party_guests_changed(sender, instance, **kwargs):
+    Party.objects.filter(pk=instance.party_id).update(updated_at=timezone.now())
+    cache.invalidate('party', instance.party_id)
+    memberships.changed('party-guests', instance.party_id)
+
+
+@receiver([post_save, post_delete], sender=Channel)
+def channel_changed(sender, instance, **kwargs):
+    cache.invalidate('channel', instance.id)
+    cache.invalidate('channel-summary', instance.id)
+
+
+@receiver([post_save, post_delete], sender=ChannelMember)
+def channel_members_changed(sender, instance, **kwargs):
+    Channel.objects.filter(pk=instance.channel_id).update(updated_at=timezone.now())
+    cache.invalidate('channel', instance.channel_id)
+    memberships.changed('channel-members', instance.channel_id)
+
+
+@receiver([post_save, post_delete], sender=Member)
+def member_changed(sender, instance, **kwargs):
+    cache.invalidate('member', instance.id)
+    cache.invalidate('profile', instance.id)
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    members = Member.objects.filter(user_id=instance.id)
+    members.update(updated_at=timezone.now())
+    member_ids = list(members.values_list('id', flat=True))
+    cache.invalidate('member', *member_ids)
+    cache.invalidate('profile', *member_ids)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    search.index(Member.objects.filter(user_id=instance.id).select_related('user'))
+
+
+@receiver(post_save, sender=Member)
+def member_saved(sender, instance, created, **kwargs):
+    # names live on the user; a new member has no terms yet
+    if created:
+        search.index([instance])
+
+
+@receiver(post_save, sender=Party)
+@receiver(post_save, sender=PartyGuest)
+@receiver(post_save, sender=Channel)
+@receiver(post_save, sender=ChannelMember)
+@receiver(post_save, sender=MessageReaction)
+def synced_saved(sender, instance, **kwargs):
+    changelog.record(instance)
+
+
+@receiver(post_delete, sender=Party)
+@receiver(post_delete, sender=PartyGuest)
+@receiver(post_delete, sender=Channel)
+@receiver(post_delete, sender=ChannelMember)
+@receiver(post_delete, sender=MessageReaction)
+def synced_deleted(sender, instance, **kwargs):
+    changelog.record(instance, deleted=True)
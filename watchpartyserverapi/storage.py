@@ -0,0 +1,41 @@
+"""Media storage that names files after their contents"""
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+
+# <sha256><ext>, as content_name() writes them
+CONTENT_NAME = re.compile(r'[0-9a-f]{64}(\.[^.]+)?')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that stores each file as <upload_to>/<sha256><ext>
+
+    Identical uploads map to the same name, so their bytes are written
+    once and every row that uploaded them shares the file. Files are never
+    rewritten, which makes old ones safe to delete only once nothing
+    references them; see the collect_media command.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+        content.seek(0)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest.hexdigest() + extension)
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # reused, so collect_media's --min-age counts it as new again
+            os.utime(self.path(name))
+            return name
+        return super()._save(name, content)
+
+
+def is_content_name(name):
+    """whether a stored file was named by ContentAddressedStorage"""
+    return CONTENT_NAME.fullmatch(os.path.basename(name)) is not None
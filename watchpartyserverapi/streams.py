@@ -0,0 +1,256 @@
+"""Server-Sent Events stream of reaction toggles per party
+
+asgi.py wraps the Django application in StreamRouter, which answers
+GET /parties/<id>/reactions/stream itself and passes everything else on.
+Django 3.1 has no async views or streaming responses under ASGI, so the
+stream is a plain ASGI coroutine.
+
+Views publish toggles to the process-wide broker from their worker thread.
+The broker fans each event out, encoded once, to every subscriber of the
+party. Subscribers only see events published in their own process, so the
+stream needs a single ASGI worker process, or one per party.
+"""
+import asyncio
+import json
+import re
+import threading
+from collections import defaultdict, deque
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.authtoken.models import Token
+from watchpartyserverapi.changelog import visible_parties
+from watchpartyserverapi.memberships import memberships
+
+# sent in place of a slow subscriber's backlog; the client re-fetches
+# /messagereactions/counts instead of replaying missed toggles
+RESYNC = b'event: resync\ndata: {}\n\n'
+
+KEEPALIVE = b': keepalive\n\n'
+
+
+def encode_event(event, payload):
+    return f'event: {event}\ndata: {json.dumps(payload, separators=(",", ":"))}\n\n'.encode('utf-8')
+
+
+class Subscription:
+    """Bounded buffer of encoded events for one connection
+
+    When the buffer is full the backlog is dropped and replaced with a
+    single resync event, so a slow reader costs at most buffer_size events
+    of memory and never delays the others. Only touched from the loop.
+    """
+
+    def __init__(self, buffer_size):
+        self.buffer_size = buffer_size
+        self.chunks = deque()
+        self.waiter = None
+        self.closed = False
+        self.idle = False
+        self.resyncs = 0
+
+    def put(self, chunk):
+        if len(self.chunks) >= self.buffer_size:
+            self.chunks.clear()
+            chunk = RESYNC
+            self.resyncs += 1
+        self.chunks.append(chunk)
+        self.wake()
+
+    def close(self):
+        self.closed = True
+        self.wake()
+
+    def wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def wait(self):
+        """until an event is queued or the connection closes"""
+        if self.chunks or self.closed:
+            return
+        self.waiter = asyncio.get_running_loop().create_future()
+        try:
+            await self.waiter
+        finally:
+            self.waiter = None
+
+    def take(self):
+        """everything queued, as one write"""
+        body = b''.join(self.chunks)
+        self.chunks.clear()
+        self.idle = False
+        return body
+
+
+class ReactionBroker:
+    """Fans out events to the subscribers of each party
+
+    Subscriptions live on the event loop; publish() may be called from any
+    thread and hands the delivery to the loop.
+    """
+
+    def __init__(self, buffer_size=100, keepalive=15.0):
+        self.buffer_size = buffer_size
+        self.keepalive = keepalive
+        self.parties = defaultdict(set)
+        self.loop = None
+        self.ticker = None
+        self.lock = threading.Lock()
+
+    def subscribe(self, party_id):
+        self.loop = asyncio.get_running_loop()
+        if self.ticker is None or self.ticker.done():
+            self.ticker = asyncio.ensure_future(self.tick())
+        subscription = Subscription(self.buffer_size)
+        with self.lock:
+            self.parties[party_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, party_id, subscription):
+        with self.lock:
+            subscribers = self.parties.get(party_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.parties[party_id]
+
+    def subscribers(self, party_id):
+        with self.lock:
+            return len(self.parties.get(party_id, ()))
+
+    def publish(self, party_id, event, payload):
+        """queue an event for every subscriber of the party"""
+        loop = self.loop
+        if loop is None or not self.subscribers(party_id):
+            return
+        chunk = encode_event(event, payload)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.deliver(party_id, chunk)
+        elif not loop.is_closed():
+            loop.call_soon_threadsafe(self.deliver, party_id, chunk)
+
+    async def tick(self):
+        """one timer for every connection: a keepalive to those idle for a whole interval"""
+        while True:
+            await asyncio.sleep(self.keepalive)
+            with self.lock:
+                subscriptions = [sub for subscribers in self.parties.values() for sub in subscribers]
+                if not subscriptions:
+                    self.ticker = None
+                    return
+            for subscription in subscriptions:
+                if subscription.idle and not subscription.chunks:
+                    subscription.put(KEEPALIVE)
+                subscription.idle = True
+
+    def deliver(self, party_id, chunk):
+        with self.lock:
+            subscribers = list(self.parties.get(party_id, ()))
+        for subscription in subscribers:
+            subscription.put(chunk)
+
+
+broker = ReactionBroker(
+    buffer_size=getattr(settings, 'REACTION_STREAM_BUFFER', 100),
+    keepalive=getattr(settings, 'REACTION_STREAM_KEEPALIVE', 15.0)
+)
+
+
+async def wait_for_disconnect(receive, subscription):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            subscription.close()
+            return
+
+
+async def stream(broker, party_id, receive, send):
+    """write a party's events to an open SSE response until the client leaves"""
+    subscription = broker.subscribe(party_id)
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive, subscription))
+    try:
+        await send({'type': 'http.response.body', 'body': b'retry: 2000\n\n', 'more_body': True})
+        while True:
+            await subscription.wait()
+            if subscription.closed:
+                break
+            # events queued while the last write was in flight go out together
+            body = subscription.take()
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        broker.unsubscribe(party_id, subscription)
+        disconnect.cancel()
+
+
+def can_watch(token, party_id):
+    """whether the token's member may see the party, None for a bad token"""
+    close_old_connections()
+    try:
+        member_id = Token.objects.filter(key=token).values_list('user__member__id', flat=True).first()
+        if member_id is None:
+            return None
+        # guests are most of the watchers and need no visibility query
+        if memberships.is_guest(party_id, member_id):
+            return True
+        return visible_parties(member_id).filter(id=party_id).exists()
+    finally:
+        close_old_connections()
+
+
+def request_token(scope):
+    """the auth token from an 'Authorization: Token ...' header or ?token=
+
+    EventSource cannot set headers, so browsers pass the token in the URL.
+    """
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            keyword, _, token = value.decode('latin-1').partition(' ')
+            if keyword == 'Token':
+                return token
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    return query.get('token', [None])[0]
+
+
+async def respond(send, status, message):
+    body = json.dumps({'message': message}).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class StreamRouter:
+    """ASGI application serving reaction streams in front of Django"""
+    path = re.compile(r'^/parties/(?P<party_id>\d+)/reactions/stream$')
+
+    def __init__(self, application, broker=broker):
+        self.application = application
+        self.broker = broker
+
+    async def __call__(self, scope, receive, send):
+        match = self.path.match(scope['path']) if scope['type'] == 'http' else None
+        if match is None:
+            return await self.application(scope, receive, send)
+
+        if scope['method'] != 'GET':
+            return await respond(send, 405, 'Method not allowed')
+
+        party_id = int(match.group('party_id'))
+        allowed = await sync_to_async(can_watch)(request_token(scope), party_id)
+        if allowed is None:
+            return await respond(send, 401, 'Invalid token')
+        if not allowed:
+            return await respond(send, 404, 'Party not found')
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        await stream(self.broker, party_id, receive, send)
@@ -1,3 +1,1398 @@
-from django.test import TestCase
+import asyncio
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib import parse
 
-# Create your tests here.
+from django import test
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from watchpartyserverapi.cache import FragmentSet, invalidate
+from watchpartyserverapi.memberships import MembershipCache
+from watchpartyserverapi.models import (Channel, ChangeLogEntry, ChannelMember, Member, MessageReaction,
+                                        Notification, NotificationCounter, OutboxNotification, Party,
+                                        PartyGuest, Reaction)
+from watchpartyserverapi.notifications import NotificationDispatcher, OutboxWorker, enqueue, enqueue_many
+from watchpartyserverapi.notifications.outbox import MAX_ATTEMPTS
+from watchpartyserverapi.notifications.sinks import LocalSink
+from watchpartyserverapi.reactionbuffer import ReactionBuffer
+from watchpartyserverapi.schedule import ScheduleIndex
+from watchpartyserverapi.streams import ReactionBroker, StreamRouter
+from watchpartyserverapi.thumbnails import ThumbnailCache
+from watchpartyserverapi.uploads import ImageTranscoder
+from watchpartyserverapi.views import member as member_views
+
+
+class TestCase(test.TestCase):
+    """TestCase starting from an empty cache
+
+    Ids repeat from test to test, so fragments, versions and member ids
+    cached by an earlier test would otherwise be read for other rows.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+
+class TransactionTestCase(test.TransactionTestCase):
+    """TransactionTestCase starting from an empty cache, see TestCase"""
+
+    def setUp(self):
+        cache.clear()
+
+
+def create_member(username, first_name=None, last_name='Test'):
+    user = User.objects.create_user(
+        username=username, password='password', first_name=first_name or username, last_name=last_name
+    )
+    member = Member.objects.create(user=user, bio='', location='', time_zone_offset=0)
+    return member
+
+
+def client_for(member):
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=member.user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+def cursor(link):
+    """the cursor parameter of a next/previous link"""
+    return parse.parse_qs(parse.urlparse(link).query)['cursor'][0]
+
+
+class KeysetPaginationTests(TestCase):
+    """GET /reactions and /parties walked page by page with cursors"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.reactions = [Reaction.objects.create(name=f'reaction {i}').id for i in range(7)]
+
+    def get_page(self, url, params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_cursor_round_trip(self):
+        page = self.get_page('/reactions', {'page_size': 3})
+        self.assertEqual([row['id'] for row in page['results']], self.reactions[:3])
+        self.assertIsNone(page['previous'])
+
+        seen = []
+        while True:
+            seen.extend(row['id'] for row in page['results'])
+            if page['next'] is None:
+                break
+            page = self.get_page('/reactions', {'page_size': 3, 'cursor': cursor(page['next'])})
+        self.assertEqual(seen, self.reactions)
+
+        # the last page leads back to the one before it
+        self.assertEqual([row['id'] for row in page['results']], self.reactions[6:])
+        previous = self.get_page('/reactions', {'page_size': 3, 'cursor': cursor(page['previous'])})
+        self.assertEqual([row['id'] for row in previous['results']], self.reactions[3:6])
+        self.assertIsNotNone(previous['next'])
+        self.assertEqual(
+            self.get_page('/reactions', {'page_size': 3, 'cursor': cursor(previous['next'])})['results'],
+            page['results']
+        )
+
+    def test_cursor_on_compound_key(self):
+        member = create_member('host')
+        start = timezone.now() + timedelta(days=1)
+        # every other party shares its start time with the one before it
+        parties = [
+            Party.objects.create(
+                creator=member, title=f'party {i}', description='',
+                datetime=start + timedelta(hours=i // 2), datetime_end=start + timedelta(hours=i // 2 + 1)
+            ).id
+            for i in range(5)
+        ]
+
+        self.client = client_for(member)
+        seen = []
+        params = {'page_size': 2}
+        while True:
+            page = self.get_page('/parties', params)
+            seen.extend(party['id'] for party in page['results'])
+            if page['next'] is None:
+                break
+            params = {'page_size': 2, 'cursor': cursor(page['next'])}
+        self.assertEqual(seen, parties)
+
+    def test_invalid_cursor(self):
+        for value in ('not a cursor', 'eyJrIjpbXX0=', 'eyJrIjpbImEiXSwiciI6ZmFsc2V9'):
+            response = self.client.get('/reactions', {'cursor': value})
+            self.assertEqual(response.status_code, 404, value)
+            self.assertEqual(response.data['detail'], 'Invalid cursor')
+
+
+DISPATCHER_LOGGER = 'watchpartyserverapi.notifications.dispatcher'
+
+
+class FailingSink:
+    """sink whose every batch commit fails"""
+
+    def write_batch(self, rows):
+        raise IOError('unavailable')
+
+
+@override_settings(NOTIFICATION_COALESCE_WINDOW=0)
+class OutboxTests(TestCase):
+    """OutboxWorker claiming, delivering and retrying queued notifications"""
+
+    def setUp(self):
+        super().setUp()
+        self.alice = create_member('alice')
+        self.bob = create_member('bob')
+
+    def test_claim_hides_rows_from_other_workers(self):
+        enqueue(self.alice.id, 'Party starting', '/parties/1')
+        enqueue(self.bob.id, 'Party starting', '/parties/1')
+
+        rows = OutboxWorker(LocalSink()).claim()
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(len({row.claim for row in rows}), 1)
+        self.assertEqual(OutboxWorker(LocalSink()).claim(), [])
+
+    def test_delivers_and_deletes(self):
+        enqueue(self.alice.id, 'Party starting', '/parties/1')
+        sink = LocalSink()
+        worker = OutboxWorker(sink)
+
+        self.assertEqual(worker.run_once(), 1)
+        self.assertEqual(sink.delivered, [(f'{self.alice.id}', 'Party starting', '/parties/1')])
+        self.assertEqual(worker.delivered, 1)
+        self.assertFalse(OutboxNotification.objects.exists())
+        self.assertEqual(worker.run_once(), 0)
+
+    def test_retries_with_backoff_then_gives_up(self):
+        enqueue(self.alice.id, 'Party starting', '/parties/1')
+        worker = OutboxWorker(FailingSink())
+
+        with self.assertLogs(DISPATCHER_LOGGER, 'ERROR'):
+            self.assertEqual(worker.run_once(), 1)
+        row = OutboxNotification.objects.get()
+        self.assertEqual(row.attempts, 1)
+        self.assertEqual(row.claim, '')
+        self.assertEqual(row.last_error, 'unavailable')
+        self.assertIsNone(row.failed_at)
+        self.assertGreater(row.available_at, timezone.now())
+        # backing off, so not due yet
+        self.assertEqual(worker.run_once(), 0)
+
+        for _ in range(MAX_ATTEMPTS - 1):
+            OutboxNotification.objects.update(available_at=timezone.now())
+            with self.assertLogs(DISPATCHER_LOGGER, 'ERROR'):
+                self.assertEqual(worker.run_once(), 1)
+        row.refresh_from_db()
+        self.assertEqual(row.attempts, MAX_ATTEMPTS)
+        self.assertIsNotNone(row.failed_at)
+
+        OutboxNotification.objects.update(available_at=timezone.now())
+        self.assertEqual(worker.run_once(), 0)
+        self.assertEqual(worker.failed, MAX_ATTEMPTS)
+
+    def test_failed_row_is_delivered_on_retry(self):
+        enqueue(self.alice.id, 'Party starting', '/parties/1')
+        with self.assertLogs(DISPATCHER_LOGGER, 'ERROR'):
+            OutboxWorker(FailingSink()).run_once()
+        OutboxNotification.objects.update(available_at=timezone.now())
+
+        sink = LocalSink()
+        self.assertEqual(OutboxWorker(sink).run_once(), 1)
+        self.assertEqual(len(sink.delivered), 1)
+        self.assertFalse(OutboxNotification.objects.exists())
+
+
+class CoalescingTests(TestCase):
+    """Notifications for the same recipient and link delivered as one write"""
+
+    def setUp(self):
+        super().setUp()
+        self.alice = create_member('alice')
+        self.bob = create_member('bob')
+
+    def test_waits_for_the_window(self):
+        enqueue(self.alice.id, 'Party updated', '/parties/1')
+        self.assertEqual(OutboxWorker(LocalSink()).run_once(), 0)
+
+    def test_burst_is_delivered_once_with_newest_content(self):
+        for content in ('Party updated', 'Party moved', 'Party renamed'):
+            enqueue(self.alice.id, content, '/parties/1')
+        enqueue(self.alice.id, 'Channel updated', '/channels/1')
+        enqueue(self.bob.id, 'Party updated', '/parties/1')
+
+        # only the oldest row is due; the rest of its burst comes along
+        first = OutboxNotification.objects.order_by('id').first()
+        OutboxNotification.objects.filter(id=first.id).update(available_at=timezone.now())
+
+        sink = LocalSink()
+        worker = OutboxWorker(sink)
+        self.assertEqual(worker.run_once(), 3)
+        self.assertEqual(sink.delivered, [(f'{self.alice.id}', 'Party renamed', '/parties/1')])
+        self.assertEqual((worker.coalesced, worker.writes), (2, 1))
+        self.assertEqual(
+            set(OutboxNotification.objects.values_list('recipient', 'link')),
+            {(f'{self.alice.id}', '/channels/1'), (f'{self.bob.id}', '/parties/1')}
+        )
+
+    def test_batches_are_capped(self):
+        for i in range(5):
+            enqueue(self.alice.id, 'Party updated', f'/parties/{i}')
+        rows = list(OutboxNotification.objects.all())
+
+        sink = LocalSink()
+        failures, metrics = NotificationDispatcher(sink, batch_limit=2).flush(rows)
+        self.assertEqual(failures, {})
+        self.assertEqual((metrics.writes, metrics.batches, metrics.coalesced), (5, 3, 0))
+        self.assertEqual(len(sink.delivered), 5)
+
+
+class SyncTests(TestCase):
+    """GET /sync change feeds, filtered to what each member can see"""
+
+    def setUp(self):
+        super().setUp()
+        self.alice = create_member('alice')
+        self.bob = create_member('bob')
+        self.carol = create_member('carol')
+        self.start = timezone.now() + timedelta(days=1)
+
+    def create_party(self, creator, is_public=True, channel=None):
+        return Party.objects.create(
+            creator=creator, channel=channel, title='Game night', description='', is_public=is_public,
+            datetime=self.start, datetime_end=self.start + timedelta(hours=3)
+        )
+
+    def sync(self, member, since):
+        response = client_for(member).get('/sync', {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def changed(self, member, since):
+        return {(change['model'], change['id']): change for change in self.sync(member, since)['changes']}
+
+    def version(self, member):
+        response = client_for(member).get('/sync')
+        self.assertEqual(response.data['changes'], [])
+        return response.data['version']
+
+    def test_version_moves_past_changes(self):
+        since = self.version(self.alice)
+        party = self.create_party(self.alice)
+
+        data = self.sync(self.alice, since)
+        self.assertEqual(data['changes'][0]['data']['id'], party.id)
+        self.assertGreater(data['version'], since)
+        self.assertEqual(self.version(self.alice), data['version'])
+        self.assertEqual(self.sync(self.alice, data['version'])['changes'], [])
+
+    def test_invalid_since(self):
+        response = client_for(self.alice).get('/sync', {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_private_party_is_only_visible_to_its_guests(self):
+        since = self.version(self.alice)
+        party = self.create_party(self.alice, is_public=False)
+        guest = PartyGuest.objects.create(party=party, guest=self.bob)
+
+        self.assertIn(('party', party.id), self.changed(self.alice, since))
+        self.assertEqual(set(self.changed(self.bob, since)), {('party', party.id), ('partyguest', guest.id)})
+        self.assertEqual(self.changed(self.carol, since), {})
+
+    def test_private_party_is_visible_through_its_channel(self):
+        channel = Channel.objects.create(name='Fans', description='', creator=self.alice)
+        ChannelMember.objects.create(channel=channel, member=self.carol)
+        since = self.version(self.alice)
+        party = self.create_party(self.alice, is_public=False, channel=channel)
+
+        self.assertIn(('party', party.id), self.changed(self.carol, since))
+        self.assertEqual(self.changed(self.bob, since), {})
+
+    def test_tombstones(self):
+        party = self.create_party(self.alice, is_public=False)
+        guest = PartyGuest.objects.create(party=party, guest=self.bob)
+        since = self.version(self.alice)
+
+        guest_id = guest.id
+        guest.delete()
+        removed = self.changed(self.bob, since)[('partyguest', guest_id)]
+        self.assertTrue(removed['deleted'])
+        self.assertIsNone(removed['data'])
+
+        # a deleted party reaches everyone, it only reveals its id
+        party_id = party.id
+        party.delete()
+        for member in (self.alice, self.bob, self.carol):
+            deleted = self.changed(member, since)[('party', party_id)]
+            self.assertTrue(deleted['deleted'])
+            self.assertIsNone(deleted['data'])
+
+    def test_only_the_latest_change_per_row(self):
+        since = self.version(self.alice)
+        party = self.create_party(self.alice)
+        party.title = 'Rematch'
+        party.save()
+
+        changes = self.sync(self.alice, since)['changes']
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0]['data']['title'], 'Rematch')
+
+        party_id = party.id
+        party.delete()
+        changes = self.sync(self.alice, since)['changes']
+        self.assertEqual([(change['id'], change['deleted']) for change in changes], [(party_id, True)])
+
+
+class ManualReactionBuffer(ReactionBuffer):
+    """ReactionBuffer without the flusher thread; tests flush it themselves"""
+
+    def start(self):
+        pass
+
+
+class ReactionBufferTests(TestCase):
+    """Reaction toggles absorbed in memory and written behind"""
+
+    def setUp(self):
+        super().setUp()
+        self.alice = create_member('alice')
+        self.bob = create_member('bob')
+        start = timezone.now() + timedelta(days=1)
+        self.party = Party.objects.create(
+            creator=self.alice, title='Game night', description='',
+            datetime=start, datetime_end=start + timedelta(hours=3)
+        )
+        self.like = Reaction.objects.create(name='like').id
+        self.wow = Reaction.objects.create(name='wow').id
+        self.buffer = ManualReactionBuffer(flush_threshold=3)
+
+    def toggle(self, member, reaction, message='m1'):
+        return self.buffer.toggle(self.party.id, member.id, reaction, message)
+
+    def stored(self):
+        return set(MessageReaction.objects.values_list('reactor_id', 'reaction_id', 'message_id'))
+
+    def test_toggle_flips_and_counts(self):
+        self.assertEqual(self.toggle(self.alice, self.like), (True, 1))
+        self.assertEqual(self.toggle(self.bob, self.like), (True, 2))
+        self.assertEqual(self.toggle(self.bob, self.wow), (True, 1))
+        self.assertEqual(self.toggle(self.bob, self.like), (False, 1))
+
+        self.assertEqual(
+            self.buffer.counts(self.party.id, ['m1'], self.bob.id),
+            {'m1': {self.like: 1, self.wow: 1, 'mine': [self.wow]}}
+        )
+        self.assertEqual(self.buffer.counts(self.party.id, ['m2'], self.bob.id), {})
+
+    def test_nothing_is_written_before_a_flush(self):
+        self.toggle(self.alice, self.like)
+        self.assertEqual(self.stored(), set())
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.stored(), {(self.alice.id, self.like, 'm1')})
+        self.assertTrue(ChangeLogEntry.objects.filter(model='messagereaction', deleted=False).exists())
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_flush_writes_the_last_state_of_each_row(self):
+        self.toggle(self.alice, self.like)
+        self.toggle(self.alice, self.like)
+        self.toggle(self.alice, self.like)
+        self.toggle(self.bob, self.wow)
+        self.toggle(self.bob, self.wow)
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.stored(), {(self.alice.id, self.like, 'm1')})
+
+    def test_toggles_stored_rows_off(self):
+        MessageReaction.objects.create(party=self.party, reactor=self.bob, reaction_id=self.like, message_id='m1')
+
+        self.assertEqual(self.toggle(self.alice, self.like), (True, 2))
+        self.assertEqual(self.toggle(self.bob, self.like), (False, 1))
+        self.buffer.flush()
+        self.assertEqual(self.stored(), {(self.alice.id, self.like, 'm1')})
+        self.assertTrue(ChangeLogEntry.objects.filter(model='messagereaction', deleted=True).exists())
+
+    def test_unknown_party_or_reaction(self):
+        self.assertIsNone(self.buffer.toggle(self.party.id + 1, self.alice.id, self.like, 'm1'))
+        self.assertIsNone(self.toggle(self.alice, self.like + self.wow))
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_threshold_wakes_the_flusher(self):
+        self.toggle(self.alice, self.like)
+        self.toggle(self.bob, self.like)
+        self.assertFalse(self.buffer.wakeup.is_set())
+        self.toggle(self.bob, self.wow)
+        self.assertTrue(self.buffer.wakeup.is_set())
+
+    def test_failed_fallback_keeps_unwritten_toggles(self):
+        start = timezone.now() + timedelta(days=1)
+        other = Party.objects.create(
+            creator=self.bob, title='Rematch', description='', datetime=start, datetime_end=start + timedelta(hours=3)
+        )
+        self.toggle(self.alice, self.like)
+        self.buffer.toggle(other.id, self.bob.id, self.wow, 'm1')
+
+        # the batch hits a constraint, the first party is written on its
+        # own and the database goes away before the second
+        failures = [IntegrityError(), None, OperationalError('database is locked')]
+        with mock.patch.object(self.buffer, 'write', side_effect=failures):
+            with self.assertRaises(OperationalError):
+                self.buffer.flush()
+
+        self.assertEqual(list(self.buffer.pending), [(other.id, self.bob.id, self.wow, 'm1')])
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.stored(), {(self.bob.id, self.wow, 'm1')})
+
+    def test_forget_drops_unflushed_toggles(self):
+        self.toggle(self.alice, self.like)
+        self.buffer.forget(self.party.id)
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.stored(), set())
+
+
+class ExplainLookupsTests(TestCase):
+    """explain_lookups seeding through the migrated models"""
+
+    def test_seeds_and_explains_every_lookup(self):
+        output = StringIO()
+        call_command('explain_lookups', seed=20, repeat=1, stdout=output)
+        self.assertEqual(output.getvalue().count('median'), 6)
+        # the seed is rolled back
+        self.assertFalse(Party.objects.exists())
+
+
+class MediaTestCase(TestCase):
+    """TestCase with MEDIA_ROOT in a temporary directory"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def save_image(self, name, size=(100, 60)):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        Image.new('RGB', size, 'red').save(path, 'JPEG')
+        return path
+
+
+class ThumbnailTests(MediaTestCase):
+    """GET /media/thumb/<size>/<path> served from a ThumbnailCache"""
+
+    def setUp(self):
+        super().setUp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.cache = ThumbnailCache(root, max_bytes=1024 * 1024, sizes=(32, 64))
+        patcher = mock.patch('watchpartyserverapi.views.thumbnails.thumbnails', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.save_image('images/avatars/me.jpeg')
+
+    def test_serves_square_variant_as_its_format(self):
+        response = self.client.get('/media/thumb/32/images/avatars/me.jpeg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        with Image.open(BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (32, 32)))
+
+    def test_not_found(self):
+        for url in ('/media/thumb/48/images/avatars/me.jpeg',
+                    '/media/thumb/32/../settings.py',
+                    '/media/thumb/32/images/avatars/missing.jpeg'):
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+
+    def test_variant_evicted_before_its_touch_is_rebuilt(self):
+        self.client.get('/media/thumb/32/images/avatars/me.jpeg')
+        with mock.patch('watchpartyserverapi.thumbnails.os.utime', side_effect=FileNotFoundError):
+            self.assertIsNone(self.cache.hit(next(iter(self.cache.entries)), 0))
+        self.assertEqual(self.client.get('/media/thumb/32/images/avatars/me.jpeg').status_code, 200)
+
+
+class BulkInviteTests(TestCase):
+    """POST /partyguests/bulk"""
+
+    def setUp(self):
+        super().setUp()
+        self.host = create_member('host')
+        self.guests = [create_member(f'guest{i}') for i in range(3)]
+        start = timezone.now() + timedelta(days=1)
+        self.party = Party.objects.create(
+            creator=self.host, title='Game night', description='', datetime=start, datetime_end=start + timedelta(hours=3)
+        )
+        self.client = client_for(self.host)
+
+    def invite(self, **data):
+        return self.client.post('/partyguests/bulk', {'party_id': self.party.id, **data}, format='json')
+
+    def guest_ids(self):
+        return set(PartyGuest.objects.filter(party=self.party).values_list('guest_id', flat=True))
+
+    def test_invited_and_skipped(self):
+        PartyGuest.objects.create(party=self.party, guest=self.guests[0])
+        ids = [guest.id for guest in self.guests]
+
+        response = self.invite(guest_ids=ids, rsvp=False)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['invited'], ids[1:])
+        self.assertEqual(response.data['skipped'], ids[:1])
+        self.assertEqual(self.guest_ids(), set(ids))
+        self.assertFalse(PartyGuest.objects.filter(party=self.party, guest_id__in=ids[1:], rsvp=True).exists())
+        self.assertEqual(
+            set(OutboxNotification.objects.values_list('recipient', flat=True)), {f'{pk}' for pk in ids[1:]}
+        )
+
+    def test_channel_members_are_invited(self):
+        channel = Channel.objects.create(name='Fans', description='', creator=self.host)
+        for guest in self.guests[:2]:
+            ChannelMember.objects.create(channel=channel, member=guest)
+
+        response = self.invite(channel_id=channel.id)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(response.data['invited']), sorted(guest.id for guest in self.guests[:2]))
+        self.assertEqual(self.guest_ids(), {guest.id for guest in self.guests[:2]})
+
+    def test_bad_input(self):
+        for data in ({'party_id': None}, {'guest_ids': 'all'}, {'guest_ids': ['x']},
+                     {'channel_id': 'fans'}, {'guest_ids': [self.guests[0].id], 'rsvp': 'maybe'}):
+            response = self.client.post('/partyguests/bulk', {'party_id': self.party.id, **data}, format='json')
+            self.assertEqual(response.status_code, 400, data)
+        self.assertEqual(self.client.post('/partyguests/bulk', {}, format='json').status_code, 400)
+        self.assertEqual(self.guest_ids(), set())
+
+    def test_unknown_party_or_channel(self):
+        self.assertEqual(
+            self.client.post('/partyguests/bulk', {'party_id': self.party.id + 1}, format='json').status_code, 404
+        )
+        self.assertEqual(self.invite(channel_id=12345).status_code, 404)
+
+    def test_guests_added_concurrently_are_not_reported(self):
+        bulk_create = PartyGuest.objects.bulk_create
+
+        def racing(rows, **kwargs):
+            # another request invites the second guest between the read and the insert
+            if not PartyGuest.objects.filter(guest=self.guests[1]).exists():
+                PartyGuest.objects.create(party=self.party, guest=self.guests[1])
+            return bulk_create(rows, **kwargs)
+
+        with mock.patch.object(PartyGuest.objects, 'bulk_create', side_effect=racing):
+            response = self.invite(guest_ids=[guest.id for guest in self.guests[1:]])
+
+        self.assertEqual((response.data['invited'], response.data['skipped']), ([self.guests[2].id], [self.guests[1].id]))
+        self.assertEqual(list(OutboxNotification.objects.values_list('recipient', flat=True)), [f'{self.guests[2].id}'])
+        self.assertEqual(ChangeLogEntry.objects.filter(model='partyguest', member_id=self.guests[1].id).count(), 1)
+
+    def test_unknown_guests_are_reported(self):
+        response = self.invite(guest_ids=[self.guests[0].id, 12345])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['invited'], response.data['unknown']), ([self.guests[0].id], [12345]))
+
+    def test_guest_ids_and_channel_are_exclusive(self):
+        channel = Channel.objects.create(name='Fans', description='', creator=self.host)
+        response = self.invite(guest_ids=[self.guests[0].id], channel_id=channel.id)
+        self.assertEqual(response.status_code, 400)
+
+
+class MemberListTests(TestCase):
+    """GET /members in its profile and summary views"""
+
+    def setUp(self):
+        super().setUp()
+        self.members = [create_member(f'member{i}') for i in range(3)]
+        self.client = client_for(self.members[0])
+
+    def test_summary_view(self):
+        response = self.client.get('/members', {'view': 'summary'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([member['id'] for member in response.data['results']], [member.id for member in self.members])
+        self.assertEqual(
+            set(response.data['results'][0]), {'id', 'full_name', 'profile_pic', 'profile_pic_thumb'}
+        )
+        self.assertEqual(response.data['results'][0]['full_name'], 'member0 Test')
+
+    def test_unknown_view(self):
+        self.assertEqual(self.client.get('/members', {'view': 'everything'}).status_code, 400)
+
+    def test_member_deleted_while_listed(self):
+        summaries = member_views.member_summaries
+
+        def deleting(ids, request):
+            Member.objects.filter(pk=self.members[1].id).delete()
+            return summaries(ids, request)
+
+        with mock.patch.object(member_views, 'member_summaries', side_effect=deleting):
+            response = self.client.get('/members', {'view': 'summary'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([member['id'] for member in response.data['results']], [self.members[0].id, self.members[2].id])
+
+
+class PartyWindowTests(TestCase):
+    """GET /parties?start=&end= and /parties/calendar"""
+
+    def setUp(self):
+        super().setUp()
+        self.host = create_member('host')
+        self.client = client_for(self.host)
+        self.parties = [
+            self.create_party(timezone.datetime(2030, 3, day, 20, tzinfo=timezone.utc)) for day in (1, 1, 15)
+        ]
+
+    def create_party(self, start, hours=3):
+        return Party.objects.create(
+            creator=self.host, title='Game night', description='', datetime=start, datetime_end=start + timedelta(hours=hours)
+        )
+
+    def test_window_overlap(self):
+        response = self.client.get('/parties', {'start': '2030-03-01T22:00:00Z', 'end': '2030-03-15T20:00:00Z'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([party['id'] for party in response.data['results']], [party.id for party in self.parties[:2]])
+        self.assertEqual(self.client.get('/parties', {'start': 'soon'}).status_code, 400)
+
+    def test_calendar_counts_by_day(self):
+        response = self.client.get('/parties/calendar', {'year': 2030, 'month': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['days'], [{'date': '2030-03-01', 'count': 2}, {'date': '2030-03-15', 'count': 1}])
+        self.assertEqual(self.client.get('/parties/calendar', {'year': 2030, 'month': 4}).data['days'], [])
+
+    def test_calendar_bounds(self):
+        for params in ({'year': 9999, 'month': 12}, {'year': 2030, 'month': 13}, {'year': 0, 'month': 1},
+                       {'year': 'next'}):
+            self.assertEqual(self.client.get('/parties/calendar', params).status_code, 400, params)
+        self.assertEqual(self.client.get('/parties/calendar', {'year': 9999, 'month': 11}).status_code, 200)
+
+
+class ContentAddressedStorageTests(MediaTestCase):
+    """uploads named by their hash, and collect_media"""
+
+    def test_identical_uploads_share_a_file(self):
+        first = default_storage.save('images/avatars/me.JPEG', ContentFile(b'same bytes'))
+        second = default_storage.save('images/avatars/you.jpeg', ContentFile(b'same bytes'))
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^images/avatars/[0-9a-f]{64}\.jpeg$')
+        self.assertNotEqual(default_storage.save('images/avatars/me.jpeg', ContentFile(b'other bytes')), first)
+
+    def test_collect_media_deletes_only_orphaned_content_addressed_files(self):
+        member = create_member('member')
+        member.profile_pic = default_storage.save('images/avatars/me.jpeg', ContentFile(b'in use'))
+        member.save()
+        orphan = default_storage.save('images/avatars/old.jpeg', ContentFile(b'replaced'))
+        legacy = 'images/avatars/image-1fcebe2b.jpeg'
+        self.save_image(legacy)
+
+        call_command('collect_media', min_age=0, dry_run=True, stdout=StringIO())
+        self.assertTrue(default_storage.exists(orphan))
+
+        call_command('collect_media', min_age=0, stdout=StringIO())
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(member.profile_pic.name))
+        self.assertTrue(default_storage.exists(legacy))
+
+    def test_collect_media_keeps_recent_files(self):
+        orphan = default_storage.save('images/avatars/new.jpeg', ContentFile(b'just uploaded'))
+        call_command('collect_media', stdout=StringIO())
+        self.assertTrue(default_storage.exists(orphan))
+
+
+class UserWithoutMemberTests(TestCase):
+    """requests from an authenticated user that has no Member row"""
+
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(username='staff', password='password')
+        token = Token.objects.create(user=user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.reaction = Reaction.objects.create(name='like')
+
+    def test_cannot_react(self):
+        response = self.client.post(
+            '/messagereactions', {'party_id': 1, 'reaction_id': self.reaction.id, 'message_id': 'm1'}, format='json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_cannot_sync(self):
+        self.assertEqual(self.client.get('/sync', {'since': 0}).status_code, 403)
+
+    def test_reads_counts_like_anonymous(self):
+        response = self.client.get('/messagereactions/counts', {'party': 1})
+        self.assertEqual((response.status_code, response.data), (200, {}))
+
+
+class ConditionalGetTests(TestCase):
+    """ETag and Last-Modified on party and member reads"""
+
+    def setUp(self):
+        super().setUp()
+        self.host = create_member('host')
+        self.guest = create_member('guest')
+        start = timezone.now() + timedelta(days=1)
+        self.party = Party.objects.create(
+            creator=self.host, title='Game night', description='', datetime=start, datetime_end=start + timedelta(hours=3)
+        )
+        self.client = client_for(self.host)
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        return response['ETag']
+
+    def test_not_modified(self):
+        url = f'/parties/{self.party.id}'
+        etag = self.etag(url)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        member = f'/members/{self.guest.id}'
+        self.assertEqual(self.client.get(member, HTTP_IF_NONE_MATCH=self.etag(member)).status_code, 304)
+
+    def test_etag_follows_the_guest_list(self):
+        url = f'/parties/{self.party.id}'
+        before = self.etag(url)
+        guest = PartyGuest.objects.create(party=self.party, guest=self.guest)
+        invited = self.etag(url)
+        self.assertNotEqual(invited, before)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=before).status_code, 200)
+
+        guest.rsvp = False
+        guest.save()
+        self.assertNotEqual(self.etag(url), invited)
+
+    def test_etag_follows_a_guest_profile(self):
+        PartyGuest.objects.create(party=self.party, guest=self.guest)
+        url = f'/parties/{self.party.id}'
+        before = self.etag(url)
+        self.guest.user.first_name = 'Renamed'
+        self.guest.user.save()
+        self.assertNotEqual(self.etag(url), before)
+
+
+class ReactionToggleTests(TransactionTestCase):
+    """POST /messagereactions as an atomic insert-or-delete
+
+    Foreign keys are checked when the toggle's transaction commits, which
+    a TestCase would turn into a savepoint.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.alice = create_member('alice')
+        self.bob = create_member('bob')
+        start = timezone.now() + timedelta(days=1)
+        self.party = Party.objects.create(
+            creator=self.alice, title='Game night', description='', datetime=start, datetime_end=start + timedelta(hours=3)
+        )
+        self.like = Reaction.objects.create(name='like')
+
+    def toggle(self, member, **data):
+        return client_for(member).post('/messagereactions', {
+            'party_id': self.party.id, 'reaction_id': self.like.id, 'message_id': 'm1', **data
+        }, format='json')
+
+    def test_toggle_on_and_off(self):
+        response = self.toggle(self.alice)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['mine'], response.data['count']), (True, 1))
+
+        response = self.toggle(self.bob)
+        self.assertEqual((response.status_code, response.data['count']), (201, 2))
+
+        response = self.toggle(self.alice)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['mine'], response.data['count']), (False, 1))
+        self.assertEqual(list(MessageReaction.objects.values_list('reactor_id', flat=True)), [self.bob.id])
+
+    def test_unknown_party_or_reaction(self):
+        self.assertEqual(self.toggle(self.alice, party_id=self.party.id + 1).status_code, 404)
+        self.assertEqual(self.toggle(self.alice, reaction_id=self.like.id + 1).status_code, 404)
+        self.assertFalse(MessageReaction.objects.exists())
+
+    def test_invalid_reaction(self):
+        self.assertEqual(self.toggle(self.alice, reaction_id='like').status_code, 400)
+
+    def test_duplicates_are_rejected(self):
+        MessageReaction.objects.create(party=self.party, reactor=self.alice, reaction=self.like, message_id='m1')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MessageReaction.objects.create(party=self.party, reactor=self.alice, reaction=self.like, message_id='m1')
+
+
+class MemberSearchTests(TestCase):
+    """GET /members/search?q= over the indexed name terms"""
+
+    def setUp(self):
+        super().setUp()
+        self.pete = create_member('ps', 'Pete', 'Stewart')
+        self.peter = create_member('spidey', 'Peter', 'Parker')
+        self.carl = create_member('carl', 'Carl', 'Peterson')
+        self.anna = create_member('petunia', 'Anna', 'Smith')
+        self.client = client_for(self.pete)
+
+    def search(self, q, **params):
+        response = self.client.get('/members/search', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [member['id'] for member in response.data]
+
+    def test_prefix_matches_ranked_by_term(self):
+        # pete, peter, peterson (a last name), petunia (a username)
+        self.assertEqual(self.search('pet'), [self.pete.id, self.peter.id, self.carl.id, self.anna.id])
+        self.assertEqual(self.search('pet', limit=2), [self.pete.id, self.peter.id])
+        self.assertEqual(self.search('smi'), [self.anna.id])
+        self.assertEqual(self.search(''), [])
+
+    def test_case_accents_and_full_names(self):
+        self.assertEqual(self.search('  PÉTE'), [self.pete.id, self.peter.id, self.carl.id])
+        self.assertEqual(self.search('peter   p'), [self.peter.id])
+
+    def test_terms_follow_renames(self):
+        self.peter.user.first_name = 'Bruce'
+        self.peter.user.save()
+        self.assertEqual(self.search('peter p'), [])
+        self.assertEqual(self.search('bruce'), [self.peter.id])
+        self.assertEqual(self.search('pet'), [self.pete.id, self.carl.id, self.anna.id])
+
+    def test_invalid_limit(self):
+        self.assertEqual(self.client.get('/members/search', {'q': 'pet', 'limit': 'all'}).status_code, 400)
+
+
+class InboxTests(TestCase):
+    """unread counts of /notifications kept in NotificationCounter"""
+
+    def setUp(self):
+        super().setUp()
+        self.alice = create_member('alice')
+        self.bob = create_member('bob')
+        self.client = client_for(self.alice)
+
+    def unread(self, member):
+        counter = NotificationCounter.objects.get(member=member).unread
+        self.assertEqual(counter, Notification.objects.filter(recipient=member, read_at__isnull=True).count())
+        return counter
+
+    def test_enqueue_counts_unread(self):
+        enqueue(self.alice.id, 'Party starting', '/party/1')
+        enqueue_many([self.alice.id, self.bob.id, self.bob.id], 'Party moved', '/party/1')
+        self.assertEqual((self.unread(self.alice), self.unread(self.bob)), (2, 1))
+        self.assertEqual(self.client.get('/notifications/unread').data, {'unread': 2})
+
+        response = self.client.get('/notifications', {'unread': 'true'})
+        self.assertEqual([row['content'] for row in response.data['results']], ['Party moved', 'Party starting'])
+
+    def test_read_some_then_all(self):
+        for i in range(3):
+            enqueue(self.alice.id, f'Party {i}', f'/party/{i}')
+        enqueue(self.bob.id, 'Party 0', '/party/0')
+        first = Notification.objects.filter(recipient=self.alice).order_by('id').first()
+        others = Notification.objects.get(recipient=self.bob)
+
+        response = self.client.post('/notifications/read', {'ids': [first.id, first.id, others.id]}, format='json')
+        self.assertEqual(response.data, {'marked': 1, 'unread': 2})
+        self.assertEqual((self.unread(self.alice), self.unread(self.bob)), (2, 1))
+
+        response = self.client.post('/notifications/read', {}, format='json')
+        self.assertEqual(response.data, {'marked': 2, 'unread': 0})
+        self.assertEqual(self.client.post('/notifications/read', {}, format='json').data, {'marked': 0, 'unread': 0})
+        self.assertEqual(self.unread(self.alice), 0)
+
+    def test_invalid_ids(self):
+        for ids in ('all', ['x'], 3):
+            self.assertEqual(self.client.post('/notifications/read', {'ids': ids}, format='json').status_code, 400)
+
+
+class ScheduleTests(TransactionTestCase):
+    """/parties/live and /parties/starting served from a ScheduleIndex
+
+    The index follows Party saves once they commit, so these tests commit.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.schedule = ScheduleIndex()
+        for target in ('watchpartyserverapi.signals.schedule', 'watchpartyserverapi.views.parties.schedule'):
+            patcher = mock.patch(target, self.schedule)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.host = create_member('host')
+        self.client = client_for(self.host)
+        self.now = timezone.now()
+
+    def create_party(self, starts_in, hours=2):
+        start = self.now + starts_in
+        return Party.objects.create(
+            creator=self.host, title='Game night', description='', datetime=start, datetime_end=start + timedelta(hours=hours)
+        )
+
+    def ids(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return [party['id'] for party in response.data]
+
+    def test_live_and_starting_windows(self):
+        live = self.create_party(-timedelta(hours=1))
+        marathon = self.create_party(-timedelta(hours=20), hours=24)
+        soon = self.create_party(timedelta(minutes=30))
+        later = self.create_party(timedelta(hours=2))
+        self.create_party(-timedelta(hours=3))
+
+        self.assertEqual(self.ids('/parties/live'), [marathon.id, live.id])
+        self.assertEqual(self.ids('/parties/starting'), [soon.id])
+        self.assertEqual(self.ids('/parties/starting', within=180), [soon.id, later.id])
+        self.assertEqual(self.client.get('/parties/starting', {'within': 'soon'}).status_code, 400)
+
+    def test_follows_saves_and_deletes(self):
+        self.assertEqual(self.ids('/parties/starting'), [])
+
+        party = self.create_party(timedelta(minutes=10))
+        self.assertEqual(self.ids('/parties/starting'), [party.id])
+
+        party.datetime = self.now - timedelta(minutes=5)
+        party.save()
+        self.assertEqual((self.ids('/parties/starting'), self.ids('/parties/live')), ([], [party.id]))
+
+        party.delete()
+        self.assertEqual(self.ids('/parties/live'), [])
+
+    def test_reload_picks_up_other_processes(self):
+        party = self.create_party(timedelta(hours=3))
+        self.assertEqual(self.ids('/parties/starting'), [])
+
+        # written without signals, as another worker's saves look here
+        Party.objects.filter(pk=party.id).update(datetime=self.now + timedelta(minutes=20))
+        self.assertEqual(self.ids('/parties/starting'), [])
+        self.schedule.load()
+        self.assertEqual(self.ids('/parties/starting'), [party.id])
+
+
+class PartyListTests(TestCase):
+    """GET /parties and /parties/:id with guests, creator and channel embedded"""
+
+    def setUp(self):
+        super().setUp()
+        self.host = create_member('host', 'Pete', 'Stewart')
+        self.client = client_for(self.host)
+        self.channel = Channel.objects.create(name='Soccer', description='', creator=self.host)
+        self.start = timezone.now() + timedelta(days=1)
+
+    def create_parties(self, count, guests):
+        for i in range(count):
+            party = Party.objects.create(
+                creator=self.host, channel=self.channel, title=f'party {i}', description='',
+                datetime=self.start + timedelta(hours=i), datetime_end=self.start + timedelta(hours=i + 1)
+            )
+            PartyGuest.objects.bulk_create(PartyGuest(party=party, guest=guest) for guest in guests)
+
+    def list_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/parties')
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data['results']
+
+    def test_embeds_creator_guests_and_channel(self):
+        guest = create_member('guest', 'Anna', 'Smith')
+        self.create_parties(1, [self.host, guest])
+        party = Party.objects.get()
+
+        for data in (self.client.get('/parties').data['results'][0], self.client.get(f'/parties/{party.id}').data):
+            self.assertEqual(data['creator']['full_name'], 'Pete Stewart')
+            self.assertEqual([member['full_name'] for member in data['guests']], ['Pete Stewart', 'Anna Smith'])
+            self.assertEqual((data['channel']['id'], data['channel']['name']), (self.channel.id, 'Soccer'))
+
+    def test_queries_do_not_grow_with_the_page(self):
+        self.create_parties(1, [self.host])
+        few, results = self.list_queries()
+        self.assertEqual(len(results), 1)
+
+        guests = [create_member(f'guest{i}') for i in range(4)]
+        self.create_parties(5, [self.host] + guests)
+        many, results = self.list_queries()
+        self.assertEqual(len(results), 6)
+        self.assertEqual(many, few)
+
+
+class MyUpcomingTests(TestCase):
+    """GET /parties/myupcoming: unfinished parties the member is a guest of"""
+
+    def setUp(self):
+        super().setUp()
+        self.member = create_member('guest')
+        self.other = create_member('other')
+        self.client = client_for(self.member)
+        self.now = timezone.now()
+
+    def create_party(self, starts_in, guests, rsvp=True):
+        start = self.now + starts_in
+        party = Party.objects.create(
+            creator=self.other, title='Game night', description='', datetime=start, datetime_end=start + timedelta(hours=2)
+        )
+        PartyGuest.objects.bulk_create(
+            PartyGuest(party=party, guest=guest, rsvp=rsvp if guest == self.member else True) for guest in guests
+        )
+        return party
+
+    def test_only_unfinished_parties_i_am_invited_to(self):
+        later = self.create_party(timedelta(days=2), [self.other, self.member], rsvp=False)
+        ongoing = self.create_party(-timedelta(hours=1), [self.member, self.other])
+        self.create_party(-timedelta(days=1), [self.member])
+        self.create_party(timedelta(days=1), [self.other])
+
+        response = self.client.get('/parties/myupcoming')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(party['id'], party['rsvp']) for party in response.data['results']],
+            [(ongoing.id, True), (later.id, False)]
+        )
+        self.assertEqual(response.data['results'][0]['creator']['id'], self.other.id)
+
+
+class FragmentCacheTests(TestCase):
+    """Party, channel and member fragments cached and dropped on change"""
+
+    def setUp(self):
+        super().setUp()
+        self.host = create_member('host', 'Pete', 'Stewart')
+        self.client = client_for(self.host)
+        self.channel = Channel.objects.create(name='Soccer', description='', creator=self.host)
+        start = timezone.now() + timedelta(days=1)
+        self.party = Party.objects.create(
+            creator=self.host, channel=self.channel, title='MLS Cup', description='',
+            datetime=start, datetime_end=start + timedelta(hours=2)
+        )
+        PartyGuest.objects.create(party=self.party, guest=self.host)
+        self.url = f'/parties/{self.party.id}'
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data
+
+    def test_second_read_is_served_from_the_cache(self):
+        cold, data = self.get()
+        warm, cached = self.get()
+        self.assertLess(warm, cold)
+        self.assertEqual(cached, data)
+
+    def test_changes_are_visible_on_the_next_read(self):
+        self.get()
+
+        self.party.title = 'MLS Cup Final'
+        self.party.save()
+        self.assertEqual(self.get()[1]['title'], 'MLS Cup Final')
+
+        self.channel.name = 'Football'
+        self.channel.save()
+        self.assertEqual(self.get()[1]['channel']['name'], 'Football')
+
+        self.host.user.first_name = 'Peter'
+        self.host.user.save()
+        data = self.get()[1]
+        self.assertEqual((data['creator']['full_name'], data['guests'][0]['full_name']), ('Peter Stewart', 'Peter Stewart'))
+
+        PartyGuest.objects.create(party=self.party, guest=create_member('anna', 'Anna', 'Smith'))
+        self.assertEqual([guest['full_name'] for guest in self.get()[1]['guests']], ['Peter Stewart', 'Anna Smith'])
+
+    def test_fragment_read_before_invalidation_is_not_reused(self):
+        request = test.RequestFactory().get(self.url)
+        stale = FragmentSet('party', [self.party.id], request)
+        invalidate('party', self.party.id)
+        stale.store(self.party.id, {'title': 'stale'})
+        stale.save()
+
+        self.assertNotIn(self.party.id, FragmentSet('party', [self.party.id], request))
+
+
+class ReactionCountsTests(TestCase):
+    """GET /messagereactions/counts aggregated per message"""
+
+    def setUp(self):
+        super().setUp()
+        self.alice = create_member('alice')
+        self.bob = create_member('bob')
+        start = timezone.now() + timedelta(days=1)
+        self.party = Party.objects.create(
+            creator=self.alice, title='Game night', description='', datetime=start, datetime_end=start + timedelta(hours=3)
+        )
+        self.like = Reaction.objects.create(name='like')
+        self.laugh = Reaction.objects.create(name='laugh')
+        for reactor, reaction, message_id in (
+            (self.alice, self.like, 'm1'), (self.bob, self.like, 'm1'), (self.bob, self.laugh, 'm1'), (self.bob, self.like, 'm2')
+        ):
+            MessageReaction.objects.create(party=self.party, reactor=reactor, reaction=reaction, message_id=message_id)
+
+    def counts(self, client, **params):
+        response = client.get('/messagereactions/counts', {'party': self.party.id, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_counts_by_message_and_reaction(self):
+        like, laugh = str(self.like.id), str(self.laugh.id)
+        self.assertEqual(self.counts(client_for(self.alice)), {
+            'm1': {like: 2, laugh: 1, 'mine': [self.like.id]},
+            'm2': {like: 1, 'mine': []},
+        })
+        self.assertEqual(self.counts(client_for(self.bob), message_ids='m2,m3'), {'m2': {like: 1, 'mine': [self.like.id]}})
+        self.assertEqual(self.counts(APIClient(), message_ids='m2'), {'m2': {like: 1, 'mine': []}})
+
+    def test_party_is_required(self):
+        client = client_for(self.alice)
+        self.assertEqual(client.get('/messagereactions/counts').status_code, 400)
+        self.assertEqual(client.get('/messagereactions/counts', {'party': 'game'}).status_code, 400)
+
+
+class ReactionStreamTests(TransactionTestCase):
+    """GET /parties/:id/reactions/stream through StreamRouter
+
+    The token is checked on a worker thread, which only sees committed rows.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.host = create_member('host')
+        self.guest = create_member('guest')
+        self.stranger = create_member('stranger')
+        start = timezone.now() + timedelta(days=1)
+        self.party = Party.objects.create(
+            creator=self.host, title='Game night', description='', is_public=False,
+            datetime=start, datetime_end=start + timedelta(hours=3)
+        )
+        PartyGuest.objects.create(party=self.party, guest=self.guest)
+        self.broker = ReactionBroker()
+        self.router = StreamRouter(self.passthrough, self.broker)
+        self.path = f'/parties/{self.party.id}/reactions/stream'
+
+    async def passthrough(self, scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 204, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    def token(self, member):
+        return Token.objects.get_or_create(user=member.user)[0].key
+
+    def request(self, path, method='GET', headers=(), query_string=b'', events=()):
+        """the messages sent back, after publishing events once subscribed"""
+        sent = []
+
+        async def run():
+            left = asyncio.Event()
+
+            async def receive():
+                await left.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {'type': 'http', 'method': method, 'path': path, 'headers': list(headers), 'query_string': query_string}
+            request = asyncio.ensure_future(self.router(scope, receive, send))
+            if events:
+                while not self.broker.subscribers(self.party.id):
+                    await asyncio.sleep(0.01)
+                for event in events:
+                    self.broker.publish(self.party.id, 'reaction', event)
+                while len(sent) < 3:
+                    await asyncio.sleep(0.01)
+                left.set()
+            await asyncio.wait_for(request, 5)
+
+        asyncio.run(run())
+        return sent
+
+    def test_token_is_required(self):
+        for headers, query_string in (((), b''), (((b'authorization', b'Token nope'),), b''), ((), b'token=nope')):
+            self.assertEqual(self.request(self.path, headers=headers, query_string=query_string)[0]['status'], 401)
+
+    def test_party_must_be_visible(self):
+        stranger = f'token={self.token(self.stranger)}'.encode()
+        self.assertEqual(self.request(self.path, query_string=stranger)[0]['status'], 404)
+        missing = f'/parties/{self.party.id + 1}/reactions/stream'
+        self.assertEqual(self.request(missing, query_string=stranger)[0]['status'], 404)
+
+    def test_guest_receives_published_toggles(self):
+        headers = ((b'authorization', f'Token {self.token(self.guest)}'.encode()),)
+        start, retry, event = self.request(self.path, headers=headers, events=[{'message_id': 'm1', 'count': 1}])[:3]
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        self.assertEqual(retry['body'], b'retry: 2000\n\n')
+        self.assertEqual(event['body'], b'event: reaction\ndata: {"message_id":"m1","count":1}\n\n')
+        self.assertEqual(self.broker.subscribers(self.party.id), 0)
+
+    def test_other_requests_pass_through(self):
+        self.assertEqual(self.request(self.path, method='POST')[0]['status'], 405)
+        self.assertEqual(self.request('/parties')[0]['status'], 204)
+
+
+class ChannelListTests(TestCase):
+    """GET /channels, optionally by member_id and without rosters"""
+
+    def setUp(self):
+        super().setUp()
+        self.alice = create_member('alice', 'Alice', 'Jones')
+        self.bob = create_member('bob', 'Bob', 'Brown')
+        self.client = client_for(self.alice)
+        self.soccer = self.create_channel('Soccer', [self.alice, self.bob])
+        self.chess = self.create_channel('Chess', [self.bob])
+        self.empty = self.create_channel('Empty', [])
+
+    def create_channel(self, name, members):
+        channel = Channel.objects.create(name=name, description='', creator=self.alice)
+        ChannelMember.objects.bulk_create(ChannelMember(channel=channel, member=member) for member in members)
+        return channel
+
+    def get(self, **params):
+        response = self.client.get('/channels', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_channels_of_a_member(self):
+        self.assertEqual([channel['id'] for channel in self.get()], [self.soccer.id, self.chess.id, self.empty.id])
+        self.assertEqual([channel['id'] for channel in self.get(member_id=self.bob.id)], [self.soccer.id, self.chess.id])
+        self.assertEqual([channel['id'] for channel in self.get(member_id=self.alice.id)], [self.soccer.id])
+
+    def test_rosters(self):
+        soccer = self.get(member_id=self.alice.id)[0]
+        self.assertEqual(soccer['creator'], {'id': self.alice.id, 'full_name': 'Alice Jones'})
+        self.assertEqual(
+            [(member['member_id'], member['full_name']) for member in soccer['members']],
+            [(self.alice.id, 'Alice Jones'), (self.bob.id, 'Bob Brown')]
+        )
+
+        soccer = self.get(member_id=self.alice.id, rosters='false')[0]
+        self.assertNotIn('members', soccer)
+        self.assertEqual(soccer['name'], 'Soccer')
+
+    def test_queries_do_not_grow_with_the_page(self):
+        def count():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.get()
+            return len(queries)
+
+        few = count()
+        carol = create_member('carol')
+        for i in range(4):
+            self.create_channel(f'channel {i}', [self.alice, self.bob, carol])
+        self.assertEqual(count(), few)
+
+
+class ImageUploadTests(MediaTestCase):
+    """POST /members/avatar and /channels/:id/image, transcoded off the request"""
+
+    def setUp(self):
+        super().setUp()
+        self.member = create_member('member')
+        self.client = client_for(self.member)
+        self.channel = Channel.objects.create(name='Soccer', description='', creator=self.member)
+        self.submitted = []
+        for view in ('member', 'channels'):
+            patcher = mock.patch(
+                f'watchpartyserverapi.views.{view}.transcoder.submit',
+                lambda upload, instance, field: self.submitted.append((type(instance), instance.pk, field))
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def upload(self, url, data, name='picture.png', size=(40, 30)):
+        if data is None:
+            output = BytesIO()
+            Image.new('RGB', size, 'blue').save(output, 'PNG')
+            data = output.getvalue()
+        upload = ContentFile(data, name=name)
+        return self.client.post(url, {'image': upload}, format='multipart')
+
+    def test_images_are_queued(self):
+        self.assertEqual(self.upload('/members/avatar', None).status_code, 202)
+        self.assertEqual(self.upload(f'/channels/{self.channel.id}/image', None).status_code, 202)
+        self.assertEqual(self.submitted, [
+            (Member, self.member.id, 'profile_pic'), (Channel, self.channel.id, 'image')
+        ])
+
+    def test_rejected_uploads(self):
+        with override_settings(IMAGE_UPLOAD_MAX_SIZE=1000):
+            response = self.upload('/members/avatar', b'x' * 2000)
+            self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.upload('/members/avatar', b'not an image', name='notes.png').status_code, 400)
+        self.assertEqual(self.client.post('/members/avatar', {}, format='multipart').status_code, 400)
+        self.assertEqual(self.upload(f'/channels/{self.channel.id + 1}/image', None).status_code, 404)
+        self.assertEqual(self.submitted, [])
+
+    def test_transcode_resizes_and_saves_the_field(self):
+        transcoder = ImageTranscoder(workers=1, max_dimension=64, image_format='WEBP')
+        self.addCleanup(transcoder.executor.shutdown)
+        fd, path = tempfile.mkstemp(suffix='.upload')
+        os.close(fd)
+        Image.new('RGB', (400, 200), 'blue').save(path, 'PNG')
+
+        # the job closes its thread's connection, which here is the test's own
+        with mock.patch('watchpartyserverapi.uploads.connection'):
+            transcoder.transcode(path, Member, self.member.id, 'profile_pic')
+
+        self.assertFalse(os.path.exists(path))
+        member = Member.objects.get(pk=self.member.id)
+        self.assertTrue(member.profile_pic.name.endswith('.webp'))
+        with Image.open(member.profile_pic.path) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (64, 32)))
+
+
+class MembershipCacheTests(TestCase):
+    """Party guest and channel member sets held per process"""
+
+    def setUp(self):
+        super().setUp()
+        self.memberships = MembershipCache(max_entries=2)
+        self.host = create_member('host')
+        self.guest = create_member('guest')
+        start = timezone.now() + timedelta(days=1)
+        self.party = Party.objects.create(
+            creator=self.host, title='Game night', description='', datetime=start, datetime_end=start + timedelta(hours=3)
+        )
+        PartyGuest.objects.create(party=self.party, guest=self.host)
+
+    def test_repeated_checks_are_served_from_memory(self):
+        self.assertTrue(self.memberships.is_guest(self.party.id, self.host.id))
+        with self.assertNumQueries(0):
+            self.assertFalse(self.memberships.is_guest(self.party.id, self.guest.id))
+            self.assertEqual(self.memberships.guest_count(self.party.id), 1)
+
+    def test_rosters_follow_changes(self):
+        self.assertFalse(self.memberships.is_guest(self.party.id, self.guest.id))
+        partyguest = PartyGuest.objects.create(party=self.party, guest=self.guest)
+        self.assertTrue(self.memberships.is_guest(self.party.id, self.guest.id))
+        partyguest.delete()
+        self.assertFalse(self.memberships.is_guest(self.party.id, self.guest.id))
+
+        channel = Channel.objects.create(name='Soccer', description='', creator=self.host)
+        self.assertEqual(self.memberships.member_count(channel.id), 0)
+        ChannelMember.objects.create(channel=channel, member=self.guest)
+        self.assertTrue(self.memberships.is_channel_member(channel.id, self.guest.id))
+
+    def test_writes_without_signals_are_marked_changed(self):
+        self.assertEqual(self.memberships.guest_count(self.party.id), 1)
+        PartyGuest.objects.bulk_create([PartyGuest(party=self.party, guest=self.guest)])
+        self.assertEqual(self.memberships.guest_count(self.party.id), 1)
+        self.memberships.changed('party-guests', self.party.id)
+        self.assertEqual(self.memberships.guest_count(self.party.id), 2)
+
+    def test_least_recently_used_rosters_are_dropped(self):
+        for party_id in (self.party.id, self.party.id + 1, self.party.id, self.party.id + 2):
+            self.memberships.guest_count(party_id)
+        self.assertEqual(list(self.memberships.rosters), [
+            ('party-guests', self.party.id), ('party-guests', self.party.id + 2)
+        ])
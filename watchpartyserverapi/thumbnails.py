@@ -0,0 +1,151 @@
+"""Square thumbnails of media files, made on first request and kept in an LRU disk cache"""
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils._os import safe_join
+from PIL import Image, ImageOps
+from watchpartyserverapi.uploads import flatten
+
+
+class ThumbnailCache:
+    """Fixed-size variants of the images under MEDIA_ROOT, stored under root
+
+    A variant is written on its first request and the cache evicts the
+    least recently used ones once they take more than max_bytes. Recency is
+    the variant's access time, touched on every hit, so the order survives
+    a restart. Its modification time is copied from the source image, and
+    a source changed since is thumbnailed again.
+    """
+
+    def __init__(self, root, max_bytes, sizes, image_format='WEBP', quality=80):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.sizes = frozenset(sizes)
+        self.image_format = image_format
+        self.quality = quality
+        # from the format, as mimetypes has no .webp before Python 3.11
+        Image.init()
+        self.content_type = Image.MIME.get(image_format.upper(), 'application/octet-stream')
+        self.lock = threading.Lock()
+        self.entries = None
+        self.total = 0
+        self.building = {}
+
+    def load(self):
+        """index the variants already on disk, least recently used first"""
+        found = []
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_atime, path, stat.st_size))
+        found.sort()
+        self.entries = OrderedDict((path, size) for _, path, size in found)
+        self.total = sum(self.entries.values())
+
+    def open(self, size, name):
+        """the size-pixel variant of the media file name, opened for reading
+
+        Raises ValueError for a size not in THUMBNAIL_SIZES,
+        SuspiciousFileOperation for a name outside MEDIA_ROOT and OSError
+        when the source is missing or not an image.
+        """
+        if size not in self.sizes:
+            raise ValueError(f'No {size}px thumbnails')
+        media_root = os.path.abspath(settings.MEDIA_ROOT)
+        source = safe_join(media_root, name)
+        modified = os.stat(source).st_mtime
+        extension = self.image_format.lower()
+        target = os.path.join(self.root, str(size), f'{os.path.relpath(source, media_root)}.{extension}')
+
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            # [lock, threads holding or waiting for it]; the entry goes
+            # with the last of them, so every caller shares one lock
+            building = self.building.setdefault(target, [threading.Lock(), 0])
+            building[1] += 1
+
+        # one thread builds a missing variant while the others wait for it,
+        # then find it stored
+        try:
+            with building[0]:
+                handle = self.hit(target, modified)
+                if handle is not None:
+                    return handle
+                written = self.build(source, target, size, modified)
+                handle = open(target, 'rb')
+        finally:
+            with self.lock:
+                building[1] -= 1
+                if not building[1]:
+                    del self.building[target]
+
+        with self.lock:
+            self.total += written - self.entries.pop(target, 0)
+            self.entries[target] = written
+            self.evict()
+        return handle
+
+    def hit(self, target, modified):
+        """the stored variant if it is as new as its source, marked as just used"""
+        try:
+            stat = os.stat(target)
+            if stat.st_mtime < modified:
+                return None
+            os.utime(target, (time.time(), stat.st_mtime))
+            handle = open(target, 'rb')
+        except FileNotFoundError:
+            # evicted by another process in between
+            return None
+        with self.lock:
+            if target in self.entries:
+                self.entries.move_to_end(target)
+            else:
+                self.entries[target] = stat.st_size
+                self.total += stat.st_size
+        return handle
+
+    def build(self, source, target, size, modified):
+        """write the variant next to its final path and move it into place"""
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            image = ImageOps.fit(flatten(image, self.image_format), (size, size))
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(target))
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                image.save(output, self.image_format, quality=self.quality)
+            os.utime(path, (time.time(), modified))
+            os.replace(path, target)
+        except Exception:
+            os.remove(path)
+            raise
+        return os.path.getsize(target)
+
+    def evict(self):
+        """drop least recently used variants until the cache fits; holds the lock"""
+        # never the variant just written, even if it alone is over the limit
+        while self.total > self.max_bytes and len(self.entries) > 1:
+            path, size = self.entries.popitem(last=False)
+            self.total -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+thumbnails = ThumbnailCache(
+    root=getattr(settings, 'THUMBNAIL_ROOT', 'thumbnails'),
+    max_bytes=getattr(settings, 'THUMBNAIL_CACHE_SIZE', 256 * 1024 * 1024),
+    sizes=getattr(settings, 'THUMBNAIL_SIZES', (32, 64, 128)),
+    image_format=getattr(settings, 'IMAGE_FORMAT', 'WEBP')
+)
@@ -0,0 +1,149 @@
+"""Multipart image uploads, spooled to disk and transcoded off the request thread"""
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.move import file_move_safe
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload, TemporaryFileUploadHandler
+from django.db import connection
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class SizeLimitUploadHandler(FileUploadHandler):
+    """Aborts a multipart upload once it passes max_size bytes
+
+    Content-Length is checked before the body is read; the running total
+    covers chunked bodies and clients that under-report it.
+    """
+
+    def __init__(self, max_size, request=None):
+        super().__init__(request)
+        self.max_size = max_size
+        self.received = 0
+        self.exceeded = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > self.max_size:
+            self.exceeded = True
+            raise StopUpload(connection_reset=True)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.exceeded = True
+            raise StopUpload(connection_reset=True)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def receive_image(request, field='image'):
+    """the uploaded image as a file spooled to disk
+
+    Must run before anything reads request.data. Raises UploadTooLarge
+    past IMAGE_UPLOAD_MAX_SIZE and ValueError when the field is missing or
+    not an image Pillow can read.
+    """
+    max_size = getattr(settings, 'IMAGE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > max_size:
+        raise UploadTooLarge(f'Uploads are limited to {max_size} bytes')
+
+    # spool every file to disk, whatever its size
+    limit = SizeLimitUploadHandler(max_size, request)
+    request.upload_handlers[:] = [limit, TemporaryFileUploadHandler(request)]
+
+    upload = request.FILES.get(field, None)
+    if limit.exceeded:
+        raise UploadTooLarge(f'Uploads are limited to {max_size} bytes')
+    if upload is None:
+        raise ValueError(f'No {field} file in the upload')
+
+    # only reads the header; the full decode happens in the worker
+    try:
+        with Image.open(upload.temporary_file_path()):
+            pass
+    except (UnidentifiedImageError, OSError):
+        raise ValueError('Unsupported image')
+    return upload
+
+
+def flatten(image, image_format):
+    """image in RGB, or RGBA when it has transparency the format can keep"""
+    keep_alpha = image_format != 'JPEG' and (
+        image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    )
+    mode = 'RGBA' if keep_alpha else 'RGB'
+    return image if image.mode == mode else image.convert(mode)
+
+
+class ImageTranscoder:
+    """Resizes and re-encodes uploaded images on a small thread pool
+
+    Each job takes over the spooled upload, writes the transcoded image to
+    the model's ImageField and saves just that field, so the usual
+    post_save cache invalidation runs.
+    """
+
+    def __init__(self, workers=2, max_dimension=1024, image_format='WEBP', quality=80):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-transcoder')
+        self.max_dimension = max_dimension
+        self.image_format = image_format
+        self.quality = quality
+
+    def submit(self, upload, instance, field):
+        """queue the upload for instance.<field>, returning the job's future"""
+        # the request deletes its temporary file when it ends
+        fd, path = tempfile.mkstemp(suffix='.upload', dir=settings.FILE_UPLOAD_TEMP_DIR)
+        os.close(fd)
+        file_move_safe(upload.temporary_file_path(), path, allow_overwrite=True)
+        return self.executor.submit(self.transcode, path, type(instance), instance.pk, field)
+
+    def encode(self, path):
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((self.max_dimension, self.max_dimension))
+            image = flatten(image, self.image_format)
+            output = BytesIO()
+            image.save(output, self.image_format, quality=self.quality)
+        return output.getvalue()
+
+    def transcode(self, path, model, pk, field):
+        try:
+            data = self.encode(path)
+            instance = model.objects.get(pk=pk)
+            extension = self.image_format.lower()
+            getattr(instance, field).save(f'{uuid4()}.{extension}', ContentFile(data), save=False)
+            update_fields = [field] + [
+                model_field.name for model_field in model._meta.concrete_fields
+                if getattr(model_field, 'auto_now', False)
+            ]
+            instance.save(update_fields=update_fields)
+        except Exception:
+            logger.exception('Transcoding %s %s.%s failed', model.__name__, pk, field)
+            raise
+        finally:
+            os.remove(path)
+            connection.close()
+
+
+transcoder = ImageTranscoder(
+    workers=getattr(settings, 'IMAGE_TRANSCODE_WORKERS', 2),
+    max_dimension=getattr(settings, 'IMAGE_MAX_DIMENSION', 1024),
+    image_format=getattr(settings, 'IMAGE_FORMAT', 'WEBP')
+)
@@ -7,3 +7,6 @@ from .parties import Parties
 from .partyguests import PartyGuests
 from .reactions import Reactions
 from .messagereactions import MessageReactions
+from .notifications import Notifications
+from .sync import Sync
+from .thumbnails import thumbnail
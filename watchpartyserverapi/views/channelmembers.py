@@ -1,3 +1,4 @@
+from django.db import IntegrityError, transaction
 from django.http import HttpResponseServerError
 from django.contrib.auth.models import User
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
@@ -6,8 +7,10 @@ from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
 from watchpartyserverapi.models import Member, Channel, ChannelMember
+from watchpartyserverapi.pagination import KeysetPagination
+from watchpartyserverapi.views.thumbnails import ThumbnailField
 
-from watchpartyserverapi.firebase.firebase import send_notification
+from watchpartyserverapi.notifications import enqueue
 
 class ChannelMembers(ViewSet):
     """Request handlers for user ChannelMember info in the WatchParty Platform"""
@@ -29,15 +32,18 @@ class ChannelMembers(ViewSet):
         channel_member.channel = channel
 
         try:
-            channel_member.save()
+            with transaction.atomic():
+                channel_member.save()
 
-            message = f"You are now a member of the channel #{channel.name}!"
-            recipient = f"{member.id}"
-            link = f"/channels/{channel.id}"
-            send_notification(recipient, message, link)
+                message = f"You are now a member of the channel #{channel.name}!"
+                recipient = f"{member.id}"
+                link = f"/channels/{channel.id}"
+                enqueue(recipient, message, link)
 
             return Response({}, status=status.HTTP_201_CREATED)
 
+        except IntegrityError:
+            return Response({'message': 'Member is already in the channel'}, status=status.HTTP_409_CONFLICT)
         except Exception as ex:
             return Response({'message': ex.args[0]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -50,8 +56,11 @@ class ChannelMembers(ViewSet):
 
             members = ChannelMember.objects.filter(channel=channel)
 
-            serializer = ChannelMemberSerializer(members, many=True, context={'request': request})
-            return Response(serializer.data)
+            paginator = KeysetPagination(ordering=('id',))
+            page = paginator.paginate_queryset(members, request, view=self)
+
+            serializer = ChannelMemberSerializer(page, many=True, context={'request': request})
+            return paginator.get_paginated_response(serializer.data)
 
     def destroy(self, request, pk=None):
         try:
@@ -78,9 +87,10 @@ class ChannelMemberSerializer(serializers.HyperlinkedModelSerializer):
     """
 
     profile_pic = ProfilePicSerializer()
+    profile_pic_thumb = ThumbnailField(source='profile_pic')
 
     class Meta:
         model = ChannelMember
         # fields = ('full_name', 'member_id')
-        fields = ('full_name', 'profile_pic', 'member_id')
+        fields = ('full_name', 'profile_pic', 'profile_pic_thumb', 'member_id')
         depth = 1
\ No newline at end of file
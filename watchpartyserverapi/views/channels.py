@@ -9,7 +9,62 @@ from rest_framework import serializers
 from rest_framework import status
 from rest_framework.decorators import action, permission_classes
 from django.core.files.base import ContentFile
+from django.db.models import Max, Prefetch
+from watchpartyserverapi.cache import FragmentSet
+from watchpartyserverapi.conditional import add_validators, entity_tag, latest, not_modified
 from watchpartyserverapi.models import Member, Channel, ChannelMember
+from watchpartyserverapi.pagination import KeysetPagination
+from watchpartyserverapi.uploads import UploadTooLarge, receive_image, transcoder
+from watchpartyserverapi.views.member import member_summaries
+from watchpartyserverapi.views.thumbnails import ThumbnailField
+
+
+def channel_last_modified(pk):
+    """latest change to a channel, its roster or the members it shows"""
+    row = Channel.objects.filter(pk=pk).annotate(
+        members_updated_at=Max('channelmember__member__updated_at')
+    ).values_list('updated_at', 'creator__updated_at', 'members_updated_at').first()
+    return latest(*row) if row is not None else None
+
+
+def serialize_channels(ids, request, rosters=True):
+    """
+    ChannelSerializer output by channel id, assembled from cached channel
+    and member fragments; without rosters the members field is left out
+    """
+    queryset = Channel.objects.prefetch_related(
+        Prefetch('channelmember_set', queryset=ChannelMember.objects.order_by('id'))
+    )
+    channels = FragmentSet('channel', ids, request).fill(
+        queryset, ChannelFragmentSerializer, {'request': request}
+    )
+
+    member_ids = []
+    for pk in channels.ids:
+        if pk in channels:
+            member_ids.append(channels[pk]['creator'])
+            if rosters:
+                member_ids.extend(channels[pk]['members'])
+    members = member_summaries(member_ids, request)
+
+    data = {}
+    for pk in channels.ids:
+        if pk in channels:
+            channel = dict(channels[pk])
+            creator = members[channel['creator']]
+            channel['creator'] = {'id': creator['id'], 'full_name': creator['full_name']}
+            if not rosters:
+                del channel['members']
+                data[pk] = channel
+                continue
+            channel['members'] = [{
+                'full_name': members[member]['full_name'],
+                'profile_pic': members[member]['profile_pic'],
+                'profile_pic_thumb': members[member]['profile_pic_thumb'],
+                'member_id': member
+            } for member in channel['members']]
+            data[pk] = channel
+    return data
 
 class Channels(ViewSet):
     """Request handles for Channel info in the WatchParty Platform"""
@@ -68,50 +123,87 @@ class Channels(ViewSet):
         except Exception as ex:
             return HttpResponseServerError(ex)
 
+    @action(methods=['post'], detail=True)
+    def image(self, request, pk=None):
+        """
+        @api {POST} /channels/:id/image POST a new channel image
+        @apiName UploadChannelImage
+        @apiGroup Channels
+
+        @apiParam {File} image multipart/form-data image, at most IMAGE_UPLOAD_MAX_SIZE bytes
+
+        @apiSuccessExample {json} Success
+            HTTP/1.1 202 Accepted
+            {
+                "message": "Channel image is being processed"
+            }
+        """
+        try:
+            upload = receive_image(request)
+        except UploadTooLarge as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except ValueError as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            channel = Channel.objects.get(pk=pk)
+
+        except Channel.DoesNotExist as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            transcoder.submit(upload, channel, 'image')
+            return Response({'message': 'Channel image is being processed'}, status=status.HTTP_202_ACCEPTED)
+
+        except Exception as ex:
+            return HttpResponseServerError(ex)
+
     def list(self, request):
-        """GET for all channels"""
+        """
+        @api {GET} /channels GET all channels
+        @apiName GetChannels
+        @apiGroup Channels
+
+        @apiParam {Number} [member_id] Only channels this member belongs to
+        @apiParam {Boolean} [rosters] Leave out each channel's members when false
+        """
         try:
             channels = Channel.objects.all()
 
 
-            # Filter by member if requested
+            # Filter by member if requested; one join, and
+            # channelmember_channel_member_uniq rules out duplicate rows
             member_id = self.request.query_params.get('member_id', None)
 
             if member_id is not None:
-                channels = []
-                member = Member.objects.get(pk=member_id)
-                member_channels = ChannelMember.objects.filter(member=member)
-                for chan in member_channels:
-                    channel = Channel.objects.get(pk=chan.channel.id)
-                    channels.append(channel)
-
-            for channel in channels:
-                members = ChannelMember.objects.filter(channel=channel)
-                channel.members = members
+                channels = channels.filter(channelmember__member_id=int(member_id))
 
-            # # Filter by member if requested
-            # member_id = self.request.query_params.get('member_id', None)
+        except Exception as ex:
+            return HttpResponseServerError(ex)
 
-            # if member_id is not None:
-            #     member = Member.objects.get(pk=member_id)
-            #     channels = channels.filter(member=member)
+        rosters = self.request.query_params.get('rosters', 'true').lower() not in ('false', '0')
 
-            serializer = ChannelSerializer(channels, many=True, context={'request': request})
-            return Response(serializer.data)
+        paginator = KeysetPagination(ordering=('id',))
+        page = paginator.paginate_queryset(channels.only('id'), request, view=self)
 
-        except Exception as ex:
-            return HttpResponseServerError(ex)
+        data = serialize_channels([channel.id for channel in page], request, rosters)
+        return paginator.get_paginated_response([data[channel.id] for channel in page if channel.id in data])
 
     def retrieve(self, request, pk=None):
         """GET for single channel"""
         try:
-            channel = Channel.objects.get(pk=pk)
+            pk = int(pk)
+            modified = channel_last_modified(pk)
+            if modified is None:
+                raise Channel.DoesNotExist('Channel matching query does not exist.')
 
-            members = ChannelMember.objects.filter(channel=channel)
-            channel.members = members
+            etag = entity_tag('channel', pk, modified)
+            response = not_modified(request, etag, modified)
+            if response is not None:
+                return response
 
-            serializer = ChannelSerializer(channel, many=False, context={'request': request})
-            return Response(serializer.data)
+            channel = serialize_channels([pk], request)
+            return add_validators(Response(channel[pk]), etag, modified)
 
         except Exception as ex:
             return HttpResponseServerError(ex)
@@ -153,11 +245,12 @@ class ChannelMemberSerializer(serializers.HyperlinkedModelSerializer):
     """
 
     profile_pic = serializers.ImageField()
+    profile_pic_thumb = ThumbnailField(source='profile_pic')
 
     class Meta:
         model = ChannelMember
         # fields = ('full_name', 'member_id')
-        fields = ('full_name', 'profile_pic', 'member_id')
+        fields = ('full_name', 'profile_pic', 'profile_pic_thumb', 'member_id')
         depth = 1
 
 
@@ -179,3 +272,17 @@ class ChannelSerializer(serializers.HyperlinkedModelSerializer):
         )
         fields = ('id', 'url', 'name', 'description', 'image', 'creator', 'members')
         depth = 1
+
+
+class ChannelFragmentSerializer(ChannelSerializer):
+    """ChannelSerializer fields with the creator and members as member ids
+
+    Arguments:
+        serializers
+    """
+
+    creator = serializers.PrimaryKeyRelatedField(read_only=True)
+    members = serializers.SerializerMethodField()
+
+    def get_members(self, obj):
+        return [channel_member.member_id for channel_member in obj.channelmember_set.all()]
@@ -7,8 +7,15 @@ from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
+from rest_framework.decorators import action
 from django.core.files.base import ContentFile
+from watchpartyserverapi.cache import FragmentSet
+from watchpartyserverapi.conditional import add_validators, entity_tag, not_modified
 from watchpartyserverapi.models import Member
+from watchpartyserverapi.pagination import KeysetPagination
+from watchpartyserverapi.search import matching_members
+from watchpartyserverapi.views.thumbnails import ThumbnailField
+from watchpartyserverapi.uploads import UploadTooLarge, receive_image, transcoder
 
 class Members(ViewSet):
     """Request handlers for user Member info in the WatchParty Platform"""
@@ -51,15 +58,22 @@ class Members(ViewSet):
                 "time_zone_offset": -6
             }
         """
-        current_user = Member.objects.get(user=request.auth.user)
-        if pk == "me":
-            serializer = ProfileSerializer(current_user, many=False, context={'request': request})
-            return Response(serializer.data)
-
         try:
-            user = Member.objects.get(pk=pk)
-            serializer = ProfileSerializer(user, many=False, context={'request': request})
-            return Response(serializer.data)
+            if pk == "me":
+                members = Member.objects.filter(user=request.auth.user)
+            else:
+                members = Member.objects.filter(pk=int(pk))
+
+            # user changes are stamped onto the member, see signals.py
+            pk, modified = members.values_list('id', 'updated_at').get()
+
+            etag = entity_tag('member', pk, modified)
+            response = not_modified(request, etag, modified)
+            if response is not None:
+                return response
+
+            profile = profiles([pk], request)
+            return add_validators(Response(profile[pk]), etag, modified)
         except Exception as ex:
             return HttpResponseServerError(ex)
 
@@ -85,31 +99,46 @@ class Members(ViewSet):
         @apiSuccess (200) {String} profile_pic Member profile pic URL
         @apiSuccess (200) {String} time_zone_offset Member time zone (hours offset to UTC)
 
+        @apiParam {String} [view] "summary" for just id, full_name, profile_pic and profile_pic_thumb
+        @apiParam {Number} [page_size] Members per page, at most 100
+
         @apiSuccessExample {json} Success
             HTTP/1.1 200 OK
             {
-                "id": 7,
-                "url": "http://localhost:8000/members/7",
-                "user": {
-                    "first_name": "Pete",
-                    "last_name": "Stewart",
-                    "email": "pete@example.com"
-                },
-                "bio": "Just here to have fun",
-                "location": "Nashville, TN",
-                "profile_pic": "http://example.com/pic.jpg",
-                "time_zone_offset": -6
-            },
-            ...
+                "next": "http://localhost:8000/members?cursor=eyJrIjpbIjE3Il0sInIiOmZhbHNlfQ%3D%3D",
+                "previous": null,
+                "results": [
+                    {
+                        "id": 7,
+                        "url": "http://localhost:8000/members/7",
+                        "user": {
+                            "first_name": "Pete",
+                            "last_name": "Stewart",
+                            "email": "pete@example.com"
+                        },
+                        "bio": "Just here to have fun",
+                        "location": "Nashville, TN",
+                        "profile_pic": "http://example.com/pic.jpg",
+                        "time_zone_offset": -6
+                    },
+                    ...
+                ]
+            }
         """
-        try:
-            users = Member.objects.all()
+        # the invite picker only shows names and avatars
+        view = request.query_params.get('view', 'profile')
+        if view not in ('profile', 'summary'):
+            return Response({'message': 'view must be profile or summary'}, status=status.HTTP_400_BAD_REQUEST)
 
-            serializer = ProfileSerializer(users, many=True, context={'request': request})
-            return Response(serializer.data)
-            
-        except Exception as ex:
-            return HttpResponseServerError(ex)
+        users = Member.objects.only('id')
+
+        paginator = KeysetPagination(ordering=('id',))
+        page = paginator.paginate_queryset(users, request, view=self)
+
+        # fragments come from the cache; misses are one query joined to auth_user
+        serialize = member_summaries if view == 'summary' else profiles
+        data = serialize([user.id for user in page], request)
+        return paginator.get_paginated_response([data[user.id] for user in page if user.id in data])
 
     def update(self, request, pk=None):
         """
@@ -155,6 +184,71 @@ class Members(ViewSet):
         except Exception as ex:
             return HttpResponseServerError(ex)
 
+    @action(methods=['get'], detail=False)
+    def search(self, request):
+        """
+        @api {GET} /members/search GET members whose names start with a query
+        @apiName SearchMembers
+        @apiGroup UserMemberProfiles
+
+        @apiParam {String} q Start of a first name, last name, full name or username
+        @apiParam {Number} [limit] Most members to return, at most 50 (default 10)
+
+        @apiSuccessExample {json} Success
+            HTTP/1.1 200 OK
+            [
+                {
+                    "id": 7,
+                    "full_name": "Pete Stewart",
+                    "profile_pic": "http://localhost:8000/media/avatar.jpeg",
+                    "profile_pic_thumb": "http://localhost:8000/media/thumb/64/avatar.jpeg"
+                }
+            ]
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response({'message': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        member_ids = matching_members(request.query_params.get('q', ''), limit)
+        summaries = member_summaries(member_ids, request)
+        return Response([summaries[pk] for pk in member_ids if pk in summaries])
+
+    @action(methods=['post'], detail=False)
+    def avatar(self, request):
+        """
+        @api {POST} /members/avatar POST a new profile pic for the current member
+        @apiName UploadMemberAvatar
+        @apiGroup Member
+
+        @apiHeader {String} Authorization Auth token
+        @apiHeaderExample {String} Authorization
+            Token 3021ed814cfc1f5c8bb4b0ac5975c576d8c66f26
+
+        @apiParam {File} image multipart/form-data image, at most IMAGE_UPLOAD_MAX_SIZE bytes
+
+        @apiSuccessExample {json} Success
+            HTTP/1.1 202 Accepted
+            {
+                "message": "Profile pic is being processed"
+            }
+        """
+        try:
+            upload = receive_image(request)
+        except UploadTooLarge as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except ValueError as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            member = Member.objects.get(user=request.auth.user)
+            # the new picture shows up once it is resized, see uploads.py
+            transcoder.submit(upload, member, 'profile_pic')
+            return Response({'message': 'Profile pic is being processed'}, status=status.HTTP_202_ACCEPTED)
+
+        except Exception as ex:
+            return HttpResponseServerError(ex)
+
 class UserSerializer(serializers.HyperlinkedModelSerializer):
     """JSON serializer for member profile
 
@@ -181,4 +275,34 @@ class ProfileSerializer(serializers.HyperlinkedModelSerializer):
         #     lookup_field='id'
         # )
         fields = ('id', 'user', 'full_name', 'bio', 'location', 'profile_pic', 'location', 'time_zone_offset')
-        depth = 1
\ No newline at end of file
+        depth = 1
+
+
+class MemberSummarySerializer(serializers.HyperlinkedModelSerializer):
+    """JSON serializer for the id, name and avatar of a member
+
+    Arguments:
+        serializers
+    """
+
+    profile_pic = serializers.ImageField()
+    profile_pic_thumb = ThumbnailField(source='profile_pic')
+
+    class Meta:
+        model = Member
+        fields = ('id', 'full_name', 'profile_pic', 'profile_pic_thumb')
+        depth = 1
+
+
+def profiles(ids, request):
+    """ProfileSerializer output by member id, from the fragment cache"""
+    return FragmentSet('profile', ids, request).fill(
+        Member.objects.select_related('user'), ProfileSerializer, {'request': request}
+    )
+
+
+def member_summaries(ids, request):
+    """MemberSummarySerializer output by member id, from the fragment cache"""
+    return FragmentSet('member', ids, request).fill(
+        Member.objects.select_related('user'), MemberSummarySerializer, {'request': request}
+    )
@@ -1,13 +1,17 @@
-from django.db.models import fields
-from django.http import HttpResponseServerError
-from django.contrib.auth.models import User
-from rest_framework.fields import IntegerField
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
+from rest_framework.decorators import action
+from watchpartyserverapi.cache import member_id
 from watchpartyserverapi.models import MessageReaction, Reaction, Member, Party
+from watchpartyserverapi.pagination import KeysetPagination
+from watchpartyserverapi.reactionbuffer import reaction_buffer
+from watchpartyserverapi.streams import broker
 
 
 class MessageReactions(ViewSet):
@@ -28,48 +32,161 @@ class MessageReactions(ViewSet):
         if message_id is not None:
             message_reactions = message_reactions.filter(message_id=message_id)
 
-        try:
-            serializer = MessageReactionSerializer(message_reactions, many=True, context={'request': request})
-            return Response(serializer.data)
-
-        except Exception as ex:
-                return HttpResponseServerError(ex)
-
-    def create(self, request):
-        """method for toggling message reaction (POST or DELETE accordingly)"""
+        paginator = KeysetPagination(ordering=('id',))
+        page = paginator.paginate_queryset(message_reactions, request, view=self)
 
+        serializer = MessageReactionSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
+    @action(methods=['get'], detail=False)
+    def counts(self, request):
+        """
+            @api {GET} /messagereactions/counts GET reaction counts per message
+            @apiName GetMessageReactionCounts
+            @apiGroup MessageReactions
+
+            @apiParam {Number} party PartyId
+            @apiParam {String} [message_ids] Comma separated message ids to limit the counts to
+
+            @apiSuccess (200) {Object} message_id Count by reaction id, and the reaction ids of the current member as mine
+            @apiSuccessExample {json} Success
+                HTTP/1.1 200 OK
+                {
+                    "-MRq3cW0x9dS": {
+                        "1": 4,
+                        "3": 1,
+                        "mine": [1]
+                    }
+                }
+        """
+        party = request.query_params.get('party', None)
+        if party is None:
+            return Response({'message': 'party is required'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            current_user = Member.objects.get(user=request.auth.user)
-
-            party = Party.objects.get(pk=request.data["party_id"])
-            reaction = Reaction.objects.get(pk=request.data["reaction_id"])
-            message_id = request.data["message_id"]
-            reactor = current_user
-            
-            message_reaction = MessageReaction()
-            message_reaction.party = party
-            message_reaction.reactor = reactor
-            message_reaction.reaction = reaction
-            message_reaction.message_id = message_id
+            party = int(party)
+        except ValueError:
+            return Response({'message': 'party must be an id'}, status=status.HTTP_400_BAD_REQUEST)
+
+        message_ids = [
+            message_id
+            for value in request.query_params.getlist('message_ids')
+            for message_id in value.split(',') if message_id
+        ]
+
+        # users without a member profile see the counts like anonymous readers
+        reactor_id = None
+        if request.auth is not None:
+            try:
+                reactor_id = member_id(request.auth.user)
+            except Member.DoesNotExist:
+                pass
+
+        if settings.REACTION_WRITE_BEHIND:
+            return Response(reaction_buffer.counts(party, message_ids, reactor_id))
+
+        message_reactions = MessageReaction.objects.filter(party_id=party)
+        if message_ids:
+            message_reactions = message_reactions.filter(message_id__in=message_ids)
+
+        # one GROUP BY, answered from messagereaction_counts_idx
+        rows = message_reactions.values('message_id', 'reaction_id').annotate(
+            count=Count('id'),
+            mine=Count('id', filter=Q(reactor_id=reactor_id))
+        ).order_by()
+
+        counts = {}
+        for row in rows:
+            message = counts.setdefault(row['message_id'], {'mine': []})
+            message[row['reaction_id']] = row['count']
+            if row['mine']:
+                message['mine'].append(row['reaction_id'])
+
+        return Response(counts)
 
-        except Exception as ex:
-            return Response({'message': ex.args[0]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            # message_reaction.save()
-            # return Response({}, status=status.HTTP_201_CREATED)
-
-        # check if reaction exists
+    def create(self, request):
+        """
+            @api {POST} /messagereactions POST toggle a reaction on a message
+            @apiName ToggleMessageReaction
+            @apiGroup MessageReactions
+
+            @apiHeader {String} Authorization Auth token
+            @apiHeaderExample {String} Authorization
+                Token 9ba45f09651c5b0c404f37a2d2572c026c146611
+
+            @apiParamExample {json} Input
+                {
+                    "party_id": 9,
+                    "reaction_id": 1,
+                    "message_id": "-MRq3cW0x9dS"
+                }
+
+            @apiSuccess (201) {Boolean} mine true when the reaction was added (201), false when removed (200)
+            @apiSuccess (201) {Number} count Reactions of this kind on the message after the toggle
+            @apiSuccessExample {json} Success
+                HTTP/1.1 201 Created
+                {
+                    "message_id": "-MRq3cW0x9dS",
+                    "reaction_id": 1,
+                    "mine": true,
+                    "count": 5
+                }
+        """
         try:
-            existing_reaction = MessageReaction.objects.get(party=party, reactor=reactor, reaction=reaction, message_id=message_id)
-
-            if existing_reaction is not None:
-                existing_reaction.delete()
-                return Response({}, status=status.HTTP_205_RESET_CONTENT)
+            reactor_id = member_id(request.auth.user)
+        except Member.DoesNotExist:
+            return Response({'message': 'Only members can react'}, status=status.HTTP_403_FORBIDDEN)
 
-        except MessageReaction.DoesNotExist:
-                message_reaction.save()
-                return Response({}, status=status.HTTP_201_CREATED)
+        try:
+            party_id = int(request.data["party_id"])
+            reaction_id = int(request.data["reaction_id"])
+            message_id = str(request.data["message_id"])
+        except (KeyError, TypeError, ValueError) as ex:
+            return Response({'message': f'Invalid reaction: {ex}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if settings.REACTION_WRITE_BEHIND:
+            toggled = reaction_buffer.toggle(party_id, reactor_id, reaction_id, message_id)
+            if toggled is None:
+                return Response({'message': 'Party or reaction does not exist'}, status=status.HTTP_404_NOT_FOUND)
+            mine, count = toggled
+            return self.toggled(party_id, reactor_id, reaction_id, message_id, mine, count)
+
+        lookup = dict(party_id=party_id, reactor_id=reactor_id, reaction_id=reaction_id, message_id=message_id)
+
+        # insert, and if messagereaction_toggle_uniq rejects it, delete the
+        # existing row instead; taps racing each other toggle in turn
+        # rather than adding duplicates
+        for _ in range(3):
+            try:
+                with transaction.atomic():
+                    MessageReaction.objects.create(**lookup)
+                mine = True
+                break
+            except IntegrityError:
+                deleted, _ = MessageReaction.objects.filter(**lookup).delete()
+                if deleted:
+                    mine = False
+                    break
+                # another tap removed the row first, or the insert hit a
+                # foreign key rather than the toggle constraint
+        else:
+            return Response({'message': 'Party or reaction does not exist'}, status=status.HTTP_404_NOT_FOUND)
+
+        count = MessageReaction.objects.filter(
+            party_id=party_id, message_id=message_id, reaction_id=reaction_id
+        ).count()
+
+        return self.toggled(party_id, reactor_id, reaction_id, message_id, mine, count)
+
+    def toggled(self, party_id, reactor_id, reaction_id, message_id, mine, count):
+        """broadcast a toggle to the party's stream and respond with the new count"""
+        event = {'message_id': message_id, 'reaction_id': reaction_id, 'reactor_id': reactor_id,
+                 'added': mine, 'count': count}
+        transaction.on_commit(lambda: broker.publish(party_id, 'reaction', event))
+
+        return Response(
+            {'message_id': message_id, 'reaction_id': reaction_id, 'mine': mine, 'count': count},
+            status=status.HTTP_201_CREATED if mine else status.HTTP_200_OK
+        )
 
     def destroy(self, request, pk=None):
         """
@@ -0,0 +1,124 @@
+from django.db import transaction
+from django.http import HttpResponseServerError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.viewsets import ViewSet
+from rest_framework.response import Response
+from rest_framework import serializers
+from rest_framework import status
+from rest_framework.decorators import action
+from watchpartyserverapi.models import Member, Notification
+from watchpartyserverapi.notifications import inbox
+from watchpartyserverapi.pagination import KeysetPagination
+
+
+class Notifications(ViewSet):
+    """Request handlers for the current member's notification inbox"""
+    permission_classes = (IsAuthenticated,)
+
+    def list(self, request):
+        """
+            @api {GET} /notifications GET notifications, newest first
+            @apiName GetNotifications
+            @apiGroup Notifications
+
+            @apiHeader {String} Authorization Auth token
+            @apiHeaderExample {String} Authorization
+                Token 9ba45f09651c5b0c404f37a2d2572c026c146611
+
+            @apiParam {Boolean} [unread] Only unread notifications when true
+
+            @apiSuccessExample {json} Success
+                HTTP/1.1 200 OK
+                {
+                    "next": "http://localhost:8000/notifications?cursor=eyJrIjpbIjIwMjEtMDEtMjBUMTg6MDA6MDBaIiwiNDIiXSwiciI6ZmFsc2V9",
+                    "previous": null,
+                    "results": [
+                        {
+                            "id": 43,
+                            "content": "You have been invited to the event Movie Night!",
+                            "link": "/party/9",
+                            "created_at": "2021-01-20T18:05:00Z",
+                            "is_read": false
+                        },
+                        ...
+                    ]
+                }
+        """
+        member_id = Member.objects.values_list('id', flat=True).get(user=request.auth.user)
+        notifications = Notification.objects.filter(recipient_id=member_id)
+
+        if request.query_params.get('unread', None) == 'true':
+            notifications = notifications.filter(read_at__isnull=True)
+
+        paginator = KeysetPagination(ordering=('-created_at', '-id'))
+        page = paginator.paginate_queryset(notifications, request, view=self)
+
+        serializer = NotificationSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(methods=['get'], detail=False)
+    def unread(self, request):
+        """
+            @api {GET} /notifications/unread GET count of unread notifications
+            @apiName GetUnreadNotificationCount
+            @apiGroup Notifications
+
+            @apiSuccessExample {json} Success
+                HTTP/1.1 200 OK
+                {
+                    "unread": 3
+                }
+        """
+        member_id = Member.objects.values_list('id', flat=True).get(user=request.auth.user)
+        return Response({'unread': inbox.unread_count(member_id)})
+
+    @action(methods=['post'], detail=False)
+    def read(self, request):
+        """
+            @api {POST} /notifications/read POST mark notifications read
+            @apiName ReadNotifications
+            @apiGroup Notifications
+
+            @apiParam {Number[]} [ids] Notification ids to mark read; all when omitted
+            @apiParamExample {json} Input
+                {
+                    "ids": [41, 43]
+                }
+
+            @apiSuccess (200) {Number} marked Notifications that were unread until now
+            @apiSuccess (200) {Number} unread Unread notifications left
+            @apiSuccessExample {json} Success
+                HTTP/1.1 200 OK
+                {
+                    "marked": 2,
+                    "unread": 1
+                }
+        """
+        ids = request.data.get('ids', None)
+        if ids is not None:
+            try:
+                if not isinstance(ids, list):
+                    raise TypeError
+                ids = [int(pk) for pk in ids]
+            except (TypeError, ValueError):
+                return Response({'message': 'ids must be a list of ids'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            member_id = Member.objects.values_list('id', flat=True).get(user=request.auth.user)
+            with transaction.atomic():
+                marked = inbox.mark_read(member_id, ids)
+            return Response({'marked': marked, 'unread': inbox.unread_count(member_id)})
+
+        except Exception as ex:
+            return HttpResponseServerError(ex)
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    """JSON serializer for inbox notifications
+
+    Arguments:
+        serializers
+    """
+    class Meta:
+        model = Notification
+        fields = ('id', 'content', 'link', 'created_at', 'is_read')
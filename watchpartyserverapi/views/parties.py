@@ -6,13 +6,98 @@ from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
 from rest_framework.decorators import action
+from django.db import transaction
+from django.db.models import Count, F, Max, Prefetch
+from django.db.models.functions import TruncDate
+from watchpartyserverapi.cache import FragmentSet
+from watchpartyserverapi.conditional import add_validators, entity_tag, latest, not_modified
 from watchpartyserverapi.models import Channel, Member, Party, PartyGuest
-from datetime import datetime
+from watchpartyserverapi.pagination import KeysetPagination
+from watchpartyserverapi.schedule import schedule
+from datetime import datetime, time, timedelta
 import pytz
-from django.utils.timezone import make_aware
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.timezone import is_naive, make_aware
 
 
-from watchpartyserverapi.firebase.firebase import send_notification
+from watchpartyserverapi.notifications import enqueue_many
+from watchpartyserverapi.views.member import member_summaries
+from watchpartyserverapi.views.thumbnails import ThumbnailField
+
+
+def party_queryset():
+    """Parties with their PartyGuest rows prefetched for PartyFragmentSerializer"""
+    return Party.objects.prefetch_related(
+        Prefetch('partyguest_set', queryset=PartyGuest.objects.order_by('id'))
+    )
+
+
+def party_last_modified(pk):
+    """latest change to a party, its roster, its channel or the members it shows"""
+    row = Party.objects.filter(pk=pk).annotate(
+        guests_updated_at=Max('partyguest__guest__updated_at')
+    ).values_list('updated_at', 'channel__updated_at', 'creator__updated_at', 'guests_updated_at').first()
+    return latest(*row) if row is not None else None
+
+
+def serialize_parties(ids, request):
+    """
+    PartySerializer output by party id, assembled from cached party, member
+    and channel fragments
+    """
+    context = {'request': request}
+    parties = FragmentSet('party', ids, request).fill(party_queryset(), PartyFragmentSerializer, context)
+
+    member_ids = []
+    channel_ids = []
+    for pk in parties.ids:
+        if pk in parties:
+            member_ids.append(parties[pk]['creator'])
+            member_ids.extend(parties[pk]['guests'])
+            channel_ids.append(parties[pk]['channel'])
+
+    members = member_summaries(member_ids, request)
+    channels = FragmentSet('channel-summary', channel_ids, request).fill(
+        Channel.objects.all(), ChannelSerializer, context
+    )
+
+    data = {}
+    for pk in parties.ids:
+        if pk in parties:
+            party = dict(parties[pk])
+            party['guests'] = [members[guest] for guest in party['guests']]
+            party['creator'] = members[party['creator']]
+            party['channel'] = channels[party['channel']] if party['channel'] is not None else None
+            data[pk] = party
+    return data
+
+
+def parse_datetime_param(value):
+    """parse an ISO date or datetime query param, treating naive values as UTC"""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date or datetime: {value}")
+        parsed = datetime.combine(day, time.min)
+    if is_naive(parsed):
+        parsed = make_aware(parsed, pytz.utc)
+    return parsed
+
+
+def scope_parties(parties, params):
+    """filter parties by the optional channel_id and guest_id query params"""
+    channel_id = params.get('channel_id', None)
+    if channel_id is not None:
+        channel = Channel.objects.get(pk=channel_id)
+        parties = parties.filter(channel=channel)
+
+    guest_id = params.get('guest_id', None)
+    if guest_id is not None:
+        parties = parties.filter(partyguest__guest_id=guest_id).distinct()
+
+    return parties
+
 
 class Parties(ViewSet):
     """Request handlers for user Party info in the WatchParty Platform"""
@@ -183,16 +268,14 @@ class Parties(ViewSet):
             party.channel = None
 
         try:
-            party.save()
-            partyguests = PartyGuest.objects.filter(party = party)
-            party.guests = partyguests
+            with transaction.atomic():
+                party.save()
+                partyguests = PartyGuest.objects.filter(party = party)
+                party.guests = partyguests
 
-            for guest in partyguests:
                 message = f"The details of {party.title} have been changed"
-                recipient = f"{guest.member_id}"
                 link = f"/party/{party.id}"
-                send_notification(recipient, message, link)
-
+                enqueue_many(partyguests.values_list('guest_id', flat=True), message, link)
 
             serializer = PartySerializer(party, many=False, context={'request': request})
             return Response(serializer.data)
@@ -237,17 +320,18 @@ class Parties(ViewSet):
                 }
         """
         try:
-            party = Party.objects.get(pk=pk)
-            partyguests = PartyGuest.objects.filter(party = party)
-            
-            guests = []
-            for partyguest in partyguests:
-                guest = partyguest.guest
-                guests.append(guest)
-            party.guests = guests
-            
-            serializer = PartySerializer(party, many=False, context={'request': request})
-            return Response(serializer.data)
+            pk = int(pk)
+            modified = party_last_modified(pk)
+            if modified is None:
+                raise Party.DoesNotExist('Party matching query does not exist.')
+
+            etag = entity_tag('party', pk, modified)
+            response = not_modified(request, etag, modified)
+            if response is not None:
+                return response
+
+            party = serialize_parties([pk], request)
+            return add_validators(Response(party[pk]), etag, modified)
 
         except Exception as ex:
             return HttpResponseServerError(ex)
@@ -291,33 +375,36 @@ class Parties(ViewSet):
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
     def list(self, request):
-
-        # send_notification(77, "test message")
-        
+        """
+        GET parties, optionally by channel_id or guest_id, and optionally only
+        those overlapping the [start, end) window
+        """
         try:
-            parties = Party.objects.all()
-
-            # filter by channel if requested
-            channel_id = self.request.query_params.get('channel_id', None)
-
-            if channel_id is not None:
-                channel = Channel.objects.get(pk=channel_id)
-                parties = parties.filter(channel=channel)
+            start = self.request.query_params.get('start', None)
+            end = self.request.query_params.get('end', None)
+            start = parse_datetime_param(start) if start is not None else None
+            end = parse_datetime_param(end) if end is not None else None
+        except ValueError as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_400_BAD_REQUEST)
 
-            for party in parties:
-                partyguests = PartyGuest.objects.filter(party = party)
-                guests = []
-                for partyguest in partyguests:
-                    guest = partyguest.guest
-                    guests.append(guest)
-                party.guests = guests
+        try:
+            parties = scope_parties(Party.objects.only('id', 'datetime'), self.request.query_params)
 
-            serializer = PartySerializer(parties, many=True, context={'request': request})
-            return Response(serializer.data)
+            # overlap test, served by the (datetime_end, datetime) index
+            if start is not None:
+                parties = parties.filter(datetime_end__gt=start)
+            if end is not None:
+                parties = parties.filter(datetime__lt=end)
 
         except Exception as ex:
             return HttpResponseServerError(ex)
 
+        paginator = KeysetPagination(ordering=('datetime', 'id'))
+        page = paginator.paginate_queryset(parties, request, view=self)
+
+        data = serialize_parties([party.id for party in page], request)
+        return paginator.get_paginated_response([data[party.id] for party in page if party.id in data])
+
     @action(methods=['get'], detail=False)
     def myupcoming(self, request):
         """
@@ -325,22 +412,85 @@ class Parties(ViewSet):
         """
         try:
             member = Member.objects.get(user=request.auth.user)
-            invites = PartyGuest.objects.filter(guest=member)
-            parties = []
 
-            for invite in invites:
-                party = invite.party
-                # make_aware(party.datetime_end, timezone='UTC', is_dst=None)
-                if party not in parties and party.datetime_end >= datetime.now(pytz.utc):
-                # if party not in parties:
-                    parties.append(party)
+            # the rsvp annotation reuses the guest join from the filter
+            parties = Party.objects.filter(
+                partyguest__guest=member,
+                datetime_end__gte=datetime.now(pytz.utc)
+            ).annotate(
+                rsvp=F('partyguest__rsvp')
+            ).select_related('creator__user', 'channel').distinct()
 
-            for party in parties:
-                partyguest = PartyGuest.objects.filter(party=party, guest=member).first()
-                party.rsvp = partyguest.rsvp
+        except Exception as ex:
+            return HttpResponseServerError(ex)
 
-            serializer = PartyWithRSVPSerializer(parties, many=True, context={'request': request})
-            return Response(serializer.data)
+        paginator = KeysetPagination(ordering=('datetime', 'id'))
+        page = paginator.paginate_queryset(parties, request, view=self)
+
+        serializer = PartyWithRSVPSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(methods=['get'], detail=False)
+    def live(self, request):
+        """
+        returns the parties in progress right now, served from the in-memory
+        schedule index
+        """
+        parties = schedule.live(datetime.now(pytz.utc))
+        serializer = PartyScheduleSerializer(parties, many=True)
+        return Response(serializer.data)
+
+    @action(methods=['get'], detail=False)
+    def starting(self, request):
+        """
+        returns the parties starting in the next `within` minutes (default 60,
+        at most a day), served from the in-memory schedule index
+        """
+        try:
+            within = int(self.request.query_params.get('within', 60))
+        except ValueError as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+        within = timedelta(minutes=min(max(within, 0), 24 * 60))
+        parties = schedule.starting(datetime.now(pytz.utc), within)
+        serializer = PartyScheduleSerializer(parties, many=True)
+        return Response(serializer.data)
+
+    @action(methods=['get'], detail=False)
+    def calendar(self, request):
+        """
+        returns the number of parties starting on each day of a month,
+        optionally by channel_id or guest_id
+        """
+        today = datetime.now(pytz.utc)
+        try:
+            year = int(self.request.query_params.get('year', today.year))
+            month = int(self.request.query_params.get('month', today.month))
+            month_start = datetime(year, month, 1, tzinfo=pytz.utc)
+            # raises for December of datetime.MAXYEAR too
+            if month == 12:
+                month_end = datetime(year + 1, 1, 1, tzinfo=pytz.utc)
+            else:
+                month_end = datetime(year, month + 1, 1, tzinfo=pytz.utc)
+        except ValueError as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            parties = scope_parties(Party.objects.all(), self.request.query_params)
+            days = parties.filter(
+                datetime__gte=month_start,
+                datetime__lt=month_end
+            ).annotate(
+                day=TruncDate('datetime')
+            ).values('day').annotate(
+                count=Count('id', distinct=True)
+            ).order_by('day')
+
+            return Response({
+                'year': year,
+                'month': month,
+                'days': [{'date': day['day'].isoformat(), 'count': day['count']} for day in days]
+            })
 
         except Exception as ex:
             return HttpResponseServerError(ex)
@@ -372,10 +522,11 @@ class MemberSerializer(serializers.HyperlinkedModelSerializer):
     """
 
     profile_pic = serializers.ImageField()
+    profile_pic_thumb = ThumbnailField(source='profile_pic')
 
     class Meta:
         model = Member
-        fields = ('id', 'full_name', 'profile_pic')
+        fields = ('id', 'full_name', 'profile_pic', 'profile_pic_thumb')
         depth = 1
 
 class PartySerializer(serializers.HyperlinkedModelSerializer):
@@ -397,6 +548,33 @@ class PartySerializer(serializers.HyperlinkedModelSerializer):
         fields = ('id', 'url', 'guests', 'title', 'datetime', 'datetime_end', 'description', 'is_public', 'creator', 'channel')
         depth = 1
 
+class PartyFragmentSerializer(PartySerializer):
+    """PartySerializer fields with creator, channel and guests as ids
+
+    Arguments:
+        serializers
+    """
+    channel = serializers.PrimaryKeyRelatedField(read_only=True)
+    creator = serializers.PrimaryKeyRelatedField(read_only=True)
+    guests = serializers.SerializerMethodField()
+
+    def get_guests(self, obj):
+        return [partyguest.guest_id for partyguest in obj.partyguest_set.all()]
+
+class PartyScheduleSerializer(serializers.Serializer):
+    """JSON serializer for party summaries from the schedule index
+
+    Arguments:
+        serializers
+    """
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    datetime = serializers.DateTimeField()
+    datetime_end = serializers.DateTimeField()
+    is_public = serializers.BooleanField()
+    channel_id = serializers.IntegerField(allow_null=True)
+    creator_id = serializers.IntegerField()
+
 class RSVPSerializer(serializers.BooleanField):
     """JSON serializer for RSVP on Party Guest"""
     fields = ('rsvp')
@@ -1,13 +1,21 @@
+from django.db import IntegrityError, transaction
 from django.http import HttpResponseServerError
+from django.utils import timezone
 from django.contrib.auth.models import User
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
-from watchpartyserverapi.models import Member, Party, PartyGuest
+from rest_framework.decorators import action
+from watchpartyserverapi import changelog
+from watchpartyserverapi.cache import invalidate
+from watchpartyserverapi.memberships import memberships
+from watchpartyserverapi.models import Channel, ChannelMember, Member, Party, PartyGuest
+from watchpartyserverapi.pagination import KeysetPagination
+from watchpartyserverapi.views.thumbnails import ThumbnailField
 
-from watchpartyserverapi.firebase.firebase import send_notification
+from watchpartyserverapi.notifications import enqueue, enqueue_many
 
 
 class PartyGuests(ViewSet):
@@ -53,19 +61,119 @@ class PartyGuests(ViewSet):
         party_guest.rsvp = request.data["rsvp"]
 
         try:
-            party_guest.save()
+            with transaction.atomic():
+                party_guest.save()
 
-            if party.title is not '':
-                message = f"You have been invited to the event {party.title}!"
-            else:
-                message = "You have been invited to an event!"
+                if party.title != '':
+                    message = f"You have been invited to the event {party.title}!"
+                else:
+                    message = "You have been invited to an event!"
 
-            recipient = f"{guest.id}"
-            link = f"/party/{party.id}"
-            send_notification(recipient, message, link)
+                recipient = f"{guest.id}"
+                link = f"/party/{party.id}"
+                enqueue(recipient, message, link)
 
             return Response({}, status=status.HTTP_201_CREATED)
 
+        except IntegrityError:
+            return Response({'message': 'Member is already a guest'}, status=status.HTTP_409_CONFLICT)
+        except Exception as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(methods=['post'], detail=False)
+    def bulk(self, request):
+        """
+            @api {POST} /partyguests/bulk POST many guests to a party
+            @apiName BulkCreatePartyGuests
+            @apiGroup PartyGuests
+
+            @apiHeader {String} Authorization Auth token
+            @apiHeaderExample {String} Authorization
+                Token 9ba45f09651c5b0c404f37a2d2572c026c146611
+
+            @apiParam {Number} party_id PartyId
+            @apiParam {Number[]} [guest_ids] MemberIds of guests
+            @apiParam {Number} [channel_id] ChannelId whose members are all invited, instead of guest_ids
+            @apiParam {Boolean} [rsvp] RSVP of the new guests
+            @apiParamExample {json} Input
+                {
+                    "party_id": 1,
+                    "channel_id": 2,
+                    "rsvp": false
+                }
+
+            @apiSuccess (201) {Number[]} invited MemberIds added as guests
+            @apiSuccess (201) {Number[]} skipped MemberIds that were already guests
+            @apiSuccess (201) {Number[]} unknown guest_ids matching no member
+            @apiSuccessExample {json} Success
+                HTTP/1.1 201 Created
+                {
+                    "invited": [3, 4, 9],
+                    "skipped": [1],
+                    "unknown": []
+                }
+        """
+        try:
+            party_id = int(request.data["party_id"])
+            channel_id = request.data.get("channel_id", None)
+            if channel_id is not None:
+                channel_id = int(channel_id)
+            guest_ids = request.data.get("guest_ids", [])
+            if not isinstance(guest_ids, list):
+                raise TypeError('guest_ids must be a list')
+            guest_ids = list(dict.fromkeys(int(guest_id) for guest_id in guest_ids))
+        except KeyError:
+            return Response({'message': 'party_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+        except (TypeError, ValueError):
+            return Response({'message': 'party_id, channel_id and guest_ids must be ids'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        rsvp = request.data.get("rsvp", True)
+        if not isinstance(rsvp, bool):
+            return Response({'message': 'rsvp must be true or false'}, status=status.HTTP_400_BAD_REQUEST)
+        if channel_id is not None and guest_ids:
+            return Response({'message': 'Pass either guest_ids or channel_id'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            party = Party.objects.get(pk=party_id)
+        except Party.DoesNotExist as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
+
+        unknown = []
+        if channel_id is not None:
+            if not Channel.objects.filter(pk=channel_id).exists():
+                return Response({'message': 'Channel matching query does not exist.'}, status=status.HTTP_404_NOT_FOUND)
+            candidates = ChannelMember.objects.filter(channel_id=channel_id).values_list('member_id', flat=True)
+        else:
+            members = set(Member.objects.filter(pk__in=guest_ids).values_list('id', flat=True))
+            candidates = [guest_id for guest_id in guest_ids if guest_id in members]
+            unknown = [guest_id for guest_id in guest_ids if guest_id not in members]
+
+        try:
+            with transaction.atomic():
+                candidates = list(dict.fromkeys(candidates))
+                existing = set(PartyGuest.objects.filter(
+                    party=party, guest_id__in=candidates
+                ).values_list('guest_id', flat=True))
+                invited = insert_guests(party, [guest_id for guest_id in candidates if guest_id not in existing], rsvp)
+                added = list(PartyGuest.objects.filter(party=party, guest_id__in=invited))
+
+                # bulk_create sends no post_save signals
+                Party.objects.filter(pk=party.id).update(updated_at=timezone.now())
+                invalidate('party', party.id)
+                memberships.changed('party-guests', party.id)
+                changelog.record_many(added)
+
+                if party.title != '':
+                    message = f"You have been invited to the event {party.title}!"
+                else:
+                    message = "You have been invited to an event!"
+                link = f"/party/{party.id}"
+                enqueue_many(invited, message, link)
+
+            skipped = sorted(set(candidates) - set(invited))
+            return Response({'invited': invited, 'skipped': skipped, 'unknown': unknown},
+                            status=status.HTTP_201_CREATED)
+
         except Exception as ex:
             return Response({'message': ex.args[0]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -78,8 +186,11 @@ class PartyGuests(ViewSet):
 
             guests = PartyGuest.objects.filter(party=party)
 
-            serializer = PartyGuestSerializer(guests, many=True, context={'request': request})
-            return Response(serializer.data)
+            paginator = KeysetPagination(ordering=('id',))
+            page = paginator.paginate_queryset(guests, request, view=self)
+
+            serializer = PartyGuestSerializer(page, many=True, context={'request': request})
+            return paginator.get_paginated_response(serializer.data)
 
     def destroy(self, request, pk=None):
         try:
@@ -91,6 +202,34 @@ class PartyGuests(ViewSet):
 
         except Exception as ex:
             return Response({'message': ex.args[0]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def insert_guests(party, guest_ids, rsvp):
+    """add the guests to the party, returning the ids of those this call added
+
+    Guests invited by another request since they were read are skipped,
+    so only the rows inserted here are announced.
+    """
+    try:
+        with transaction.atomic():
+            PartyGuest.objects.bulk_create([
+                PartyGuest(party=party, guest_id=guest_id, rsvp=rsvp) for guest_id in guest_ids
+            ])
+        return guest_ids
+    except IntegrityError:
+        pass
+
+    added = []
+    for guest_id in guest_ids:
+        try:
+            with transaction.atomic():
+                PartyGuest.objects.bulk_create([PartyGuest(party=party, guest_id=guest_id, rsvp=rsvp)])
+            added.append(guest_id)
+        except IntegrityError:
+            pass
+    return added
+
+
 class PartyGuestSerializer(serializers.HyperlinkedModelSerializer):
     """JSON serializer for party guests
 
@@ -99,8 +238,9 @@ class PartyGuestSerializer(serializers.HyperlinkedModelSerializer):
     """
 
     profile_pic = serializers.ImageField()
+    profile_pic_thumb = ThumbnailField(source='profile_pic')
 
     class Meta:
         model = PartyGuest
-        fields = ('id', 'full_name', 'profile_pic', 'guest_id', 'rsvp')
+        fields = ('id', 'full_name', 'profile_pic', 'profile_pic_thumb', 'guest_id', 'rsvp')
         depth = 1
\ No newline at end of file
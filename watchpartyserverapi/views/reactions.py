@@ -7,6 +7,7 @@ from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
 from watchpartyserverapi.models import Reaction
+from watchpartyserverapi.pagination import KeysetPagination
 
 
 class Reactions(ViewSet):
@@ -15,12 +16,13 @@ class Reactions(ViewSet):
 
     def list(self, request):
         """GET all reactions"""
-        try:
-            reactions = Reaction.objects.all()
-            serializer = ReactionSerializer(reactions, many=True, context={'request': request})
-            return Response(serializer.data)
-        except Exception as ex:
-            return HttpResponseServerError(ex)
+        reactions = Reaction.objects.all()
+
+        paginator = KeysetPagination(ordering=('id',))
+        page = paginator.paginate_queryset(reactions, request, view=self)
+
+        serializer = ReactionSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
     def retrieve(self, request, pk=None):
         """GET single reaction"""
@@ -0,0 +1,128 @@
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.viewsets import ViewSet
+from rest_framework.response import Response
+from rest_framework import status
+from watchpartyserverapi import changelog
+from watchpartyserverapi.cache import member_id
+from watchpartyserverapi.models import ChannelMember, Member, MessageReaction, PartyGuest
+from watchpartyserverapi.views.channels import serialize_channels
+from watchpartyserverapi.views.parties import serialize_parties
+
+MAX_CHANGES = 1000
+
+ROW_FIELDS = {
+    'partyguest': (PartyGuest, ('id', 'party_id', 'guest_id', 'rsvp')),
+    'channelmember': (ChannelMember, ('id', 'channel_id', 'member_id')),
+    'messagereaction': (MessageReaction, ('id', 'party_id', 'reactor_id', 'reaction_id', 'message_id')),
+}
+
+
+class Sync(ViewSet):
+    """Request handlers for incremental sync of parties, channels and reactions"""
+    permission_classes = (IsAuthenticated,)
+
+    def list(self, request):
+        """
+            @api {GET} /sync?since=:version GET changes since a version
+            @apiName Sync
+            @apiGroup Sync
+
+            @apiHeader {String} Authorization Auth token
+            @apiHeaderExample {String} Authorization
+                Token 9ba45f09651c5b0c404f37a2d2572c026c146611
+
+            @apiParam {Number} [since] Version returned by the previous sync. Without it
+                only the current version is returned; call this before the first full
+                download and poll with it afterwards.
+            @apiParam {Number} [limit] Most log entries to read, up to 1000
+
+            @apiSuccess (200) {Number} version Version to pass as since next time
+            @apiSuccess (200) {Boolean} more true when more changes are waiting
+            @apiSuccess (200) {Object[]} changes Latest state of each changed row; data is null when deleted
+            @apiSuccessExample {json} Success
+                HTTP/1.1 200 OK
+                {
+                    "version": 1042,
+                    "more": false,
+                    "changes": [
+                        {
+                            "version": 1040,
+                            "model": "partyguest",
+                            "id": 311,
+                            "deleted": false,
+                            "data": {"id": 311, "party_id": 9, "guest_id": 4, "rsvp": true}
+                        },
+                        {
+                            "version": 1042,
+                            "model": "party",
+                            "id": 12,
+                            "deleted": true,
+                            "data": null
+                        }
+                    ]
+                }
+        """
+        since = request.query_params.get('since', None)
+        if since is None:
+            return Response({'version': changelog.latest_version(), 'more': False, 'changes': []})
+
+        try:
+            since = int(since)
+            limit = min(max(int(request.query_params.get('limit', MAX_CHANGES)), 1), MAX_CHANGES)
+        except ValueError as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            member = member_id(request.auth.user)
+        except Member.DoesNotExist:
+            return Response({'message': 'Only members can sync'}, status=status.HTTP_403_FORBIDDEN)
+
+        entries = list(
+            changelog.visible_entries(member)
+            .filter(id__gt=since).order_by('id')[:limit + 1]
+        )
+        more = len(entries) > limit
+        entries = entries[:limit]
+
+        # only the newest entry per row matters
+        latest = {}
+        for entry in entries:
+            latest.pop((entry.model, entry.object_id), None)
+            latest[(entry.model, entry.object_id)] = entry
+
+        data = self.current_rows(latest.values(), request)
+
+        changes = []
+        for (model, pk), entry in latest.items():
+            row = data[model].get(pk) if not entry.deleted else None
+            changes.append({
+                'version': entry.id,
+                'model': model,
+                'id': pk,
+                # deleted since, by an entry past this page
+                'deleted': row is None,
+                'data': row
+            })
+
+        return Response({
+            'version': entries[-1].id if entries else since,
+            'more': more,
+            'changes': changes
+        })
+
+    def current_rows(self, entries, request):
+        """{model: {id: data}} for the rows the entries upsert"""
+        ids = {model: [] for model in changelog.SYNCED_MODELS.values()}
+        for entry in entries:
+            if not entry.deleted:
+                ids[entry.model].append(entry.object_id)
+
+        data = {
+            'party': serialize_parties(ids['party'], request) if ids['party'] else {},
+            'channel': serialize_channels(ids['channel'], request) if ids['channel'] else {},
+        }
+        for model, (model_class, fields) in ROW_FIELDS.items():
+            data[model] = {
+                row['id']: row for row in model_class.objects.filter(id__in=ids[model]).values(*fields)
+            } if ids[model] else {}
+        return data
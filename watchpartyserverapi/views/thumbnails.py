@@ -0,0 +1,53 @@
+"""Thumbnails of uploaded images"""
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.urls import reverse
+from django.views.decorators.http import require_safe
+from PIL import Image
+from rest_framework import serializers
+from watchpartyserverapi.thumbnails import thumbnails
+
+# chat rosters show 32px avatars, twice that for high density screens
+ROSTER_SIZE = 64
+
+
+@require_safe
+def thumbnail(request, size, path):
+    '''Serves a square variant of a media file, see thumbnails.py
+
+    Method arguments:
+        request -- The full HTTP request object
+        size -- Edge in pixels, one of THUMBNAIL_SIZES
+        path -- Name of the file under MEDIA_ROOT
+    '''
+    try:
+        handle = thumbnails.open(int(size), path)
+    except (ValueError, SuspiciousFileOperation, OSError, Image.DecompressionBombError) as ex:
+        raise Http404(ex)
+
+    response = FileResponse(handle, content_type=thumbnails.content_type)
+    # uploads get fresh names, so a variant only changes with the default images
+    response['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+
+class ThumbnailField(serializers.ImageField):
+    """Absolute URL of an image's size-pixel thumbnail
+
+    Arguments:
+        size -- Edge in pixels, one of THUMBNAIL_SIZES
+    """
+
+    def __init__(self, size=ROSTER_SIZE, **kwargs):
+        self.size = size
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = reverse('thumbnail', kwargs={'size': self.size, 'path': value.name})
+        request = self.context.get('request', None)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url